@@ -8,6 +8,7 @@ import json
 import os
 import logging
 from http.server import BaseHTTPRequestHandler
+from typing import Any, Dict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,21 +21,38 @@ except ImportError:
     logger.warning("pizzapi not available, using mock mode")
     PIZZAPI_AVAILABLE = False
 
-# Global order state
-pizza_order_state = {
-    "store": None,
-    "items": []
-}
+# Shared helpers live in the mcpizza package at the repo root
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcpizza.api_tools import add_item, add_lines, locate_store, search_store_menu, view_order_state
+from mcpizza.cart import MAX_ORDER_LINES
+from mcpizza.menu_index import DEFAULT_SEARCH_LIMIT
+from mcpizza.paging import PAGING_PROPERTIES, PageRequest, next_page_hint
+from mcpizza.sessions import SESSION_HEADER, new_session_id, session_store_from_env
+from mcpizza.store_cache import MAX_BATCH_ADDRESSES, resolve_addresses
+from mcpizza.store_registry import nearest_mock_store
 
-def get_mock_store_data():
+def new_order_state() -> Dict[str, Any]:
     return {
-        "store_id": "4521",
-        "phone": "(555) 123-PIZZA", 
-        "address": "123 Mock St, Demo City",
-        "is_delivery_store": True,
-        "min_delivery_order_amount": 10.00,
-        "delivery_minutes": "25-35",
-        "pickup_minutes": "15-25",
+        "store": None,
+        "items": []
+    }
+
+# Order state per client session, keyed by the Mcp-Session-Id request header
+order_sessions = session_store_from_env(new_order_state)
+
+def get_mock_store_data(address: str = ""):
+    """Mock store data for fallback, from the nearest store in the mock registry"""
+    store = nearest_mock_store(address)
+    wait_minutes = store["ServiceEstimatedWaitMinutes"]
+    return {
+        "store_id": store["StoreID"],
+        "phone": store["Phone"],
+        "address": f"{store['StreetName']}, {store['City']}, {store['Region']} {store['PostalCode']}",
+        "is_delivery_store": store["IsDeliveryStore"],
+        "min_delivery_order_amount": store["MinDeliveryOrderAmount"],
+        "delivery_minutes": wait_minutes["Delivery"],
+        "pickup_minutes": wait_minutes["Carryout"],
         "source": "mock"
     }
 
@@ -69,82 +87,87 @@ def get_mock_menu_items(query=""):
     
     return items
 
-def find_dominos_store(address: str):
+def find_dominos_store(address: str, remember: bool = True):
+    """Find nearest Domino's store"""
     use_real_api = os.getenv("MCPIZZA_REAL_API", "false").lower() == "true"
     
     if use_real_api and PIZZAPI_AVAILABLE:
         try:
             logger.info(f"🔍 Finding real store near: {address}")
-            store = StoreLocator.find_closest_store_to_customer(address)
-            
-            if store:
-                pizza_order_state["store"] = store
-                return {
-                    "store_id": store.data.get("StoreID"),
-                    "phone": store.data.get("Phone"),
-                    "address": f"{store.data.get('StreetName', '')} {store.data.get('City', '')}",
-                    "is_delivery_store": store.data.get("IsDeliveryStore"),
-                    "source": "real_api"
-                }
+            # Only the caller's own thread may touch its session (batch lookups run on workers)
+            result = locate_store(address, order_sessions.current() if remember else None)
+            if result:
+                return result
         except Exception as e:
             logger.error(f"Real API failed: {e}")
     
+    # Use mock data
     logger.info("🟡 Using mock store data")
-    return get_mock_store_data()
+    return get_mock_store_data(address)
 
-def search_menu(query: str):
+def find_dominos_stores(addresses: list) -> list:
+    """Find the nearest store for each of many addresses, leaving the order's store unchanged"""
+    return resolve_addresses(addresses, lambda address: find_dominos_store(address, remember=False))
+
+def search_menu(query: str, store_id: str = None, limit: int = DEFAULT_SEARCH_LIMIT):
+    """Search menu items"""
     use_real_api = os.getenv("MCPIZZA_REAL_API", "false").lower() == "true"
     
-    if use_real_api and PIZZAPI_AVAILABLE and pizza_order_state.get("store"):
-        try:
-            logger.info(f"🔍 Searching real menu for: {query}")
-            menu = pizza_order_state["store"].get_menu()
-            
-            matching_items = []
-            for category_name, items in menu.data.items():
-                if isinstance(items, dict) and "Products" in items:
-                    for product_code, product_data in items["Products"].items():
-                        if isinstance(product_data, dict):
-                            name = product_data.get("Name", "").lower()
-                            description = product_data.get("Description", "").lower()
-                            
-                            if query.lower() in name or query.lower() in description:
-                                matching_items.append({
-                                    "category": category_name,
-                                    "code": product_code,
-                                    "name": product_data.get("Name", ""),
-                                    "description": product_data.get("Description", ""),
-                                    "price": product_data.get("Price", ""),
-                                    "source": "real_api"
-                                })
-            
-            if matching_items:
-                return matching_items
-        except Exception as e:
-            logger.error(f"Real menu search failed: {e}")
+    try:
+        matching_items = search_store_menu(order_sessions.current(), query, store_id, limit, live=use_real_api and PIZZAPI_AVAILABLE)
+        if matching_items:
+            return matching_items
+    except Exception as e:
+        logger.error(f"Real menu search failed: {e}")
     
+    # Use mock data
     logger.info(f"🟡 Using mock menu data for query: {query}")
     return get_mock_menu_items(query)
 
-def add_to_order(item_code: str, quantity: int = 1):
-    pizza_order_state["items"].append({
-        "code": item_code,
-        "quantity": quantity
-    })
-    return f"Added {quantity}x {item_code} to order"
+def add_to_order(item_code: str, quantity: int = 1) -> str:
+    """Add item to order; a line for the same item is merged"""
+    return add_item(order_sessions.current(), item_code, quantity)
+
+def add_items_to_order(items: list) -> str:
+    """Add many items at once; lines for the same item and options are merged"""
+    return add_lines(order_sessions.current(), items)
 
 def view_order():
-    return {
-        "items": pizza_order_state["items"],
-        "item_count": len(pizza_order_state["items"])
-    }
+    """View current order"""
+    return view_order_state(order_sessions.current())
+
+def call_tool(tool_name: str, tool_args: Dict[str, Any]) -> str:
+    """Run a tool and return its text content"""
+    if tool_name == "find_dominos_store":
+        result = find_dominos_store(tool_args["address"])
+        content = json.dumps(result, indent=2)
+    elif tool_name == "find_dominos_stores":
+        result = find_dominos_stores(tool_args["addresses"])
+        content = json.dumps(result, indent=2)
+    elif tool_name == "search_menu":
+        page = PageRequest.from_arguments(tool_args)
+        result = search_menu(tool_args["query"], tool_args.get("store_id"), limit=page.end + 1)
+        content, next_cursor = page.render(result)
+        content += next_page_hint(next_cursor)
+    elif tool_name == "add_to_order":
+        result = add_to_order(tool_args["item_code"], tool_args.get("quantity", 1))
+        content = result
+    elif tool_name == "add_items_to_order":
+        content = add_items_to_order(tool_args["items"])
+    elif tool_name == "view_order":
+        result = view_order()
+        content = json.dumps(result, indent=2)
+    else:
+        raise ValueError(f"Unknown tool: {tool_name}")
+    return content
 
 class handler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', f'Content-Type, {SESSION_HEADER}')
+        self.send_header('Access-Control-Expose-Headers', SESSION_HEADER)
         self.end_headers()
 
     def do_GET(self):
@@ -188,6 +211,8 @@ class handler(BaseHTTPRequestHandler):
             method = request.get("method")
             params = request.get("params", {})
             request_id = request.get("id")
+            # The server issues session ids; a request without one starts a new session
+            session_id = self.headers.get(SESSION_HEADER) or new_session_id()
 
             if method == "initialize":
                 response = {
@@ -222,13 +247,26 @@ class handler(BaseHTTPRequestHandler):
                                     "required": ["address"]
                                 }
                             },
+                            {
+                                "name": "find_dominos_stores",
+                                "description": "Find the nearest Domino's store for each of many addresses at once",
+                                "inputSchema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "addresses": {"type": "array", "items": {"type": "string"}, "maxItems": MAX_BATCH_ADDRESSES, "description": "Addresses or zip codes, answered in the same order"}
+                                    },
+                                    "required": ["addresses"]
+                                }
+                            },
                             {
                                 "name": "search_menu",
                                 "description": "Search for menu items by name or description",
                                 "inputSchema": {
                                     "type": "object",
                                     "properties": {
-                                        "query": {"type": "string", "description": "Search term (e.g., 'pepperoni pizza', 'wings')"}
+                                        "query": {"type": "string", "description": "Search term (e.g., 'pepperoni pizza', 'wings')"},
+                                        "store_id": {"type": "string", "description": "Optional store ID"},
+                                        **PAGING_PROPERTIES
                                     },
                                     "required": ["query"]
                                 }
@@ -245,6 +283,25 @@ class handler(BaseHTTPRequestHandler):
                                     "required": ["item_code"]
                                 }
                             },
+                            {
+                                "name": "add_items_to_order",
+                                "description": "Add many items to pizza order at once; lines for the same item are merged",
+                                "inputSchema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "items": {"type": "array", "maxItems": MAX_ORDER_LINES, "description": "Order lines, all checked before any is added", "items": {
+                                            "type": "object",
+                                            "properties": {
+                                                "item_code": {"type": "string", "description": "Product code from menu search"},
+                                                "quantity": {"type": "integer", "description": "Number of items", "default": 1},
+                                                "options": {"type": "object", "description": "Item customization options", "default": {}}
+                                            },
+                                            "required": ["item_code"]
+                                        }}
+                                    },
+                                    "required": ["items"]
+                                }
+                            },
                             {
                                 "name": "view_order",
                                 "description": "View current order contents",
@@ -263,20 +320,7 @@ class handler(BaseHTTPRequestHandler):
                 tool_args = params.get("arguments", {})
                 
                 try:
-                    if tool_name == "find_dominos_store":
-                        result = find_dominos_store(tool_args["address"])
-                        content = json.dumps(result, indent=2)
-                    elif tool_name == "search_menu":
-                        result = search_menu(tool_args["query"])
-                        content = json.dumps(result, indent=2)
-                    elif tool_name == "add_to_order":
-                        result = add_to_order(tool_args["item_code"], tool_args.get("quantity", 1))
-                        content = result
-                    elif tool_name == "view_order":
-                        result = view_order()
-                        content = json.dumps(result, indent=2)
-                    else:
-                        raise ValueError(f"Unknown tool: {tool_name}")
+                    content = order_sessions.run(session_id, call_tool, tool_name, tool_args)
                     
                     response = {
                         "jsonrpc": "2.0",
@@ -314,6 +358,8 @@ class handler(BaseHTTPRequestHandler):
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Expose-Headers', SESSION_HEADER)
+            self.send_header(SESSION_HEADER, session_id)
             self.end_headers()
             self.wfile.write(json.dumps(response).encode())
 
@@ -21,24 +21,46 @@ except ImportError:
     logger.warning("pizzapi not available, using mock mode")
     PIZZAPI_AVAILABLE = False
 
-# Global order state (will reset between function calls in serverless)
-pizza_order_state = {
-    "store": None,
-    "customer": None,
-    "order": None,
-    "items": []
-}
+# Shared helpers live in the mcpizza package at the repo root
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mcpizza.api_tools import add_item, add_lines, locate_store, search_store_menu, view_order_state
+from mcpizza.breaker import breaker_stats
+from mcpizza.bulkhead import bulkhead_stats
+from mcpizza.cart import MAX_ORDER_LINES
+from mcpizza.menu_cache import interning_stats, menu_cache, menu_flight
+from mcpizza.menu_index import DEFAULT_SEARCH_LIMIT
+from mcpizza.paging import PAGING_PROPERTIES, PageRequest, next_page_hint
+from mcpizza.sessions import SESSION_HEADER, new_session_id, session_store_from_env
+from mcpizza.store_cache import MAX_BATCH_ADDRESSES, locator_flight, resolve_addresses, store_cache
+from mcpizza.store_registry import nearest_mock_store
 
-def get_mock_store_data():
-    """Mock store data for fallback"""
+def new_order_state() -> Dict[str, Any]:
     return {
-        "store_id": "4521",
-        "phone": "(555) 123-PIZZA",
-        "address": "123 Mock St, Demo City",
-        "is_delivery_store": True,
-        "min_delivery_order_amount": 10.00,
-        "delivery_minutes": "25-35",
-        "pickup_minutes": "15-25",
+        "store": None,
+        "customer": None,
+        "order": None,
+        "items": []
+    }
+
+# Added cart lines are marked as mock orders
+MOCK_LINE_FIELDS = {"timestamp": "mock"}
+
+# Order state per client session, keyed by the Mcp-Session-Id request header
+order_sessions = session_store_from_env(new_order_state)
+
+def get_mock_store_data(address: str = ""):
+    """Mock store data for fallback, from the nearest store in the mock registry"""
+    store = nearest_mock_store(address)
+    wait_minutes = store["ServiceEstimatedWaitMinutes"]
+    return {
+        "store_id": store["StoreID"],
+        "phone": store["Phone"],
+        "address": f"{store['StreetName']}, {store['City']}, {store['Region']} {store['PostalCode']}",
+        "is_delivery_store": store["IsDeliveryStore"],
+        "min_delivery_order_amount": store["MinDeliveryOrderAmount"],
+        "delivery_minutes": wait_minutes["Delivery"],
+        "pickup_minutes": wait_minutes["Carryout"],
         "source": "mock"
     }
 
@@ -77,7 +99,7 @@ def get_mock_menu_items(query=""):
     
     return items
 
-def find_dominos_store(address: str) -> Dict[str, Any]:
+def find_dominos_store(address: str, remember: bool = True) -> Dict[str, Any]:
     """Find nearest Domino's store"""
     use_real_api = os.getenv("MCPIZZA_REAL_API", "false").lower() == "true"
     use_fallback = os.getenv("MCPIZZA_FALLBACK_MOCK", "true").lower() == "true"
@@ -85,20 +107,10 @@ def find_dominos_store(address: str) -> Dict[str, Any]:
     if use_real_api and PIZZAPI_AVAILABLE:
         try:
             logger.info(f"🔍 Finding real store near: {address}")
-            store = StoreLocator.find_closest_store_to_customer(address)
-            
-            if store:
-                pizza_order_state["store"] = store
-                return {
-                    "store_id": store.data.get("StoreID"),
-                    "phone": store.data.get("Phone"),
-                    "address": f"{store.data.get('StreetName', '')} {store.data.get('City', '')}",
-                    "is_delivery_store": store.data.get("IsDeliveryStore"),
-                    "min_delivery_order_amount": store.data.get("MinDeliveryOrderAmount"),
-                    "delivery_minutes": store.data.get("ServiceEstimatedWaitMinutes", {}).get("Delivery"),
-                    "pickup_minutes": store.data.get("ServiceEstimatedWaitMinutes", {}).get("Carryout"),
-                    "source": "real_api"
-                }
+            # Only the caller's own thread may touch its session (batch lookups run on workers)
+            result = locate_store(address, order_sessions.current() if remember else None)
+            if result:
+                return result
         except Exception as e:
             logger.error(f"Real API failed: {e}")
             if not use_fallback:
@@ -106,64 +118,41 @@ def find_dominos_store(address: str) -> Dict[str, Any]:
     
     # Use mock data
     logger.info("🟡 Using mock store data")
-    return get_mock_store_data()
+    return get_mock_store_data(address)
+
+def find_dominos_stores(addresses: list) -> list:
+    """Find the nearest store for each of many addresses, leaving the order's store unchanged"""
+    return resolve_addresses(addresses, lambda address: find_dominos_store(address, remember=False))
 
-def search_menu(query: str, store_id: str = None) -> list:
+def search_menu(query: str, store_id: str = None, limit: int = DEFAULT_SEARCH_LIMIT) -> list:
     """Search menu items"""
     use_real_api = os.getenv("MCPIZZA_REAL_API", "false").lower() == "true"
     use_fallback = os.getenv("MCPIZZA_FALLBACK_MOCK", "true").lower() == "true"
     
-    if use_real_api and PIZZAPI_AVAILABLE and pizza_order_state.get("store"):
-        try:
-            logger.info(f"🔍 Searching real menu for: {query}")
-            menu = pizza_order_state["store"].get_menu()
-            
-            matching_items = []
-            for category_name, items in menu.data.items():
-                if isinstance(items, dict) and "Products" in items:
-                    for product_code, product_data in items["Products"].items():
-                        if isinstance(product_data, dict):
-                            name = product_data.get("Name", "").lower()
-                            description = product_data.get("Description", "").lower()
-                            
-                            if query.lower() in name or query.lower() in description:
-                                matching_items.append({
-                                    "category": category_name,
-                                    "code": product_code,
-                                    "name": product_data.get("Name", ""),
-                                    "description": product_data.get("Description", ""),
-                                    "price": product_data.get("Price", ""),
-                                    "source": "real_api"
-                                })
-            
-            if matching_items:
-                return matching_items
-        except Exception as e:
-            logger.error(f"Real menu search failed: {e}")
-            if not use_fallback:
-                raise
+    try:
+        matching_items = search_store_menu(order_sessions.current(), query, store_id, limit, live=use_real_api and PIZZAPI_AVAILABLE)
+        if matching_items:
+            return matching_items
+    except Exception as e:
+        logger.error(f"Real menu search failed: {e}")
+        if not use_fallback:
+            raise
     
     # Use mock data
     logger.info(f"🟡 Using mock menu data for query: {query}")
     return get_mock_menu_items(query)
 
 def add_to_order(item_code: str, quantity: int = 1) -> str:
-    """Add item to order"""
-    pizza_order_state["items"].append({
-        "code": item_code,
-        "quantity": quantity,
-        "timestamp": "mock"
-    })
-    
-    return f"Added {quantity}x {item_code} to order"
+    """Add item to order; a line for the same item is merged"""
+    return add_item(order_sessions.current(), item_code, quantity, extra=MOCK_LINE_FIELDS)
+
+def add_items_to_order(items: list) -> str:
+    """Add many items at once; lines for the same item and options are merged"""
+    return add_lines(order_sessions.current(), items, extra=MOCK_LINE_FIELDS)
 
 def view_order() -> Dict[str, Any]:
     """View current order"""
-    return {
-        "items": pizza_order_state["items"],
-        "item_count": len(pizza_order_state["items"]),
-        "note": "Order state resets between API calls in serverless mode"
-    }
+    return view_order_state(order_sessions.current())
 
 # MCP Protocol handlers
 def handle_list_tools():
@@ -181,6 +170,17 @@ def handle_list_tools():
                     "required": ["address"]
                 }
             },
+            {
+                "name": "find_dominos_stores",
+                "description": "Find the nearest Domino's store for each of many addresses at once",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "addresses": {"type": "array", "items": {"type": "string"}, "maxItems": MAX_BATCH_ADDRESSES, "description": "Addresses or zip codes, answered in the same order"}
+                    },
+                    "required": ["addresses"]
+                }
+            },
             {
                 "name": "search_menu", 
                 "description": "Search for menu items by name or description",
@@ -188,7 +188,8 @@ def handle_list_tools():
                     "type": "object",
                     "properties": {
                         "query": {"type": "string", "description": "Search term (e.g., 'pepperoni pizza', 'wings')"},
-                        "store_id": {"type": "string", "description": "Optional store ID"}
+                        "store_id": {"type": "string", "description": "Optional store ID"},
+                        **PAGING_PROPERTIES
                     },
                     "required": ["query"]
                 }
@@ -205,6 +206,25 @@ def handle_list_tools():
                     "required": ["item_code"]
                 }
             },
+            {
+                "name": "add_items_to_order",
+                "description": "Add many items to pizza order at once; lines for the same item are merged",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "items": {"type": "array", "maxItems": MAX_ORDER_LINES, "description": "Order lines, all checked before any is added", "items": {
+                            "type": "object",
+                            "properties": {
+                                "item_code": {"type": "string", "description": "Product code from menu search"},
+                                "quantity": {"type": "integer", "description": "Number of items", "default": 1},
+                                "options": {"type": "object", "description": "Item customization options", "default": {}}
+                            },
+                            "required": ["item_code"]
+                        }}
+                    },
+                    "required": ["items"]
+                }
+            },
             {
                 "name": "view_order",
                 "description": "View current order contents",
@@ -224,14 +244,24 @@ def handle_call_tool(name: str, arguments: Dict[str, Any]):
             result = find_dominos_store(arguments["address"])
             return {"content": [{"type": "text", "text": json.dumps(result, indent=2)}]}
         
-        elif name == "search_menu":
-            result = search_menu(arguments["query"], arguments.get("store_id"))
+        elif name == "find_dominos_stores":
+            result = find_dominos_stores(arguments["addresses"])
             return {"content": [{"type": "text", "text": json.dumps(result, indent=2)}]}
         
+        elif name == "search_menu":
+            page = PageRequest.from_arguments(arguments)
+            result = search_menu(arguments["query"], arguments.get("store_id"), limit=page.end + 1)
+            text, next_cursor = page.render(result)
+            return {"content": [{"type": "text", "text": text + next_page_hint(next_cursor)}]}
+        
         elif name == "add_to_order":
             result = add_to_order(arguments["item_code"], arguments.get("quantity", 1))
             return {"content": [{"type": "text", "text": result}]}
         
+        elif name == "add_items_to_order":
+            result = add_items_to_order(arguments["items"])
+            return {"content": [{"type": "text", "text": result}]}
+        
         elif name == "view_order":
             result = view_order()
             return {"content": [{"type": "text", "text": json.dumps(result, indent=2)}]}
@@ -252,7 +282,8 @@ class handler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', f'Content-Type, {SESSION_HEADER}')
+        self.send_header('Access-Control-Expose-Headers', SESSION_HEADER)
         self.end_headers()
         
     def do_GET(self):
@@ -262,7 +293,13 @@ class handler(BaseHTTPRequestHandler):
                 "version": "1.0.0", 
                 "description": "Domino's Pizza Ordering MCP Server",
                 "real_api_enabled": os.getenv("MCPIZZA_REAL_API", "false") == "true",
-                "fallback_enabled": os.getenv("MCPIZZA_FALLBACK_MOCK", "true") == "true"
+                "fallback_enabled": os.getenv("MCPIZZA_FALLBACK_MOCK", "true") == "true",
+                "menu_cache": {**menu_cache.stats(), **interning_stats()},
+                "store_cache": store_cache.stats(),
+                "single_flight": {"menu": menu_flight.stats(), "locator": locator_flight.stats()},
+                "sessions": order_sessions.stats(),
+                "circuit_breakers": breaker_stats(),
+                "bulkheads": bulkhead_stats()
             }
             
             self.send_response(200)
@@ -290,19 +327,29 @@ class handler(BaseHTTPRequestHandler):
             
             method = data.get("method")
             params = data.get("params", {})
+            # The server issues session ids; a request without one starts a new session
+            session_id = self.headers.get(SESSION_HEADER) or new_session_id()
             
-            if method == "tools/list":
+            if method == "initialize":
+                response = {
+                    "protocolVersion": "1.0.0",
+                    "capabilities": {"tools": {}},
+                    "serverInfo": {"name": "MCPizza", "version": "1.0.0"}
+                }
+            elif method == "tools/list":
                 response = handle_list_tools()
             elif method == "tools/call":
                 tool_name = params.get("name")
                 tool_args = params.get("arguments", {})
-                response = handle_call_tool(tool_name, tool_args)
+                response = order_sessions.run(session_id, handle_call_tool, tool_name, tool_args)
             else:
                 response = {"error": "Unknown method"}
             
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Expose-Headers', SESSION_HEADER)
+            self.send_header(SESSION_HEADER, session_id)
             self.end_headers()
             self.wfile.write(json.dumps(response).encode())
             
@@ -0,0 +1,124 @@
+"""
+MCPizza serverless tools
+
+Tool logic shared by the HTTP endpoints in api/, which keep each session's
+order as a plain dict ({"store": ..., "items": [...]}) instead of a
+PizzaOrder. Each endpoint decides when to call Domino's and what mock data
+to fall back to; everything here works on the session state it is given.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from .cart import line_key, parse_lines, validate_lines
+from .dominos import ClientStore, locate_closest_store
+from .menu_cache import StoreMenu, find_store_menu, load_store_menu
+from .menu_index import DEFAULT_SEARCH_LIMIT
+from .pricing import estimate_order
+from .store_cache import find_closest_store
+from .store_registry import registry_locator
+
+logger = logging.getLogger("mcpizza")
+
+
+def store_summary(store: Any) -> Dict[str, Any]:
+    """find_dominos_store result for a located store"""
+    wait_minutes = store.data.get("ServiceEstimatedWaitMinutes", {})
+    return {
+        "store_id": store.data.get("StoreID"),
+        "phone": store.data.get("Phone"),
+        "address": f"{store.data.get('StreetName', '')} {store.data.get('City', '')}",
+        "is_delivery_store": store.data.get("IsDeliveryStore"),
+        "min_delivery_order_amount": store.data.get("MinDeliveryOrderAmount"),
+        "delivery_minutes": wait_minutes.get("Delivery"),
+        "pickup_minutes": wait_minutes.get("Carryout"),
+        "source": "real_api"
+    }
+
+
+def locate_store(address: str, state: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Summary of the store nearest address, or None if there isn't one
+
+    With a session state the store also becomes the order's store. Batch
+    lookups run on worker threads and pass no state.
+    """
+    store = find_closest_store(address, registry_locator(locate_closest_store, ClientStore))
+    if not store:
+        return None
+    if state is not None:
+        state["store"] = store
+    return store_summary(store)
+
+
+def order_menu(state: Dict[str, Any]) -> Optional[StoreMenu]:
+    """Cached or snapshotted menu of the order's store, without calling Domino's"""
+    store = state.get("store")
+    return find_store_menu(store.data.get("StoreID")) if store else None
+
+
+def search_store_menu(state: Dict[str, Any], query: str, store_id: Optional[str] = None,
+                      limit: int = DEFAULT_SEARCH_LIMIT, live: bool = False) -> List[Dict[str, Any]]:
+    """Menu items matching query; empty when there is no menu to search
+
+    A cached or snapshotted menu answers without an upstream call. With live
+    set, the order's own store's menu is fetched when it isn't cached or its
+    snapshot has gone stale; otherwise a stale snapshot still answers.
+    """
+    store = state.get("store")
+    if store and not store_id:
+        store_id = store.data.get("StoreID")
+    if not store_id:
+        return []
+    can_fetch = live and bool(store) and str(store.data.get("StoreID")) == str(store_id)
+    menu = find_store_menu(store_id, allow_stale=not can_fetch)
+    if menu is None and can_fetch:
+        logger.info(f"🔍 Searching real menu for: {query}")
+        menu = load_store_menu(store)
+    if menu is None:
+        return []
+    return [{**menu.table.to_dict(product), "source": "real_api"} for product in menu.index.search(query, limit=limit)]
+
+
+def add_lines(state: Dict[str, Any], items: Any, extra: Optional[Dict[str, Any]] = None) -> str:
+    """Add [{"item_code", "quantity", "options"}] lines to the order, all or none
+
+    Lines for an item and options already in the cart are merged into it.
+    Codes are checked against the order's menu when it is cached. extra is
+    copied into each new cart line (e.g. mock timestamps).
+    """
+    lines = parse_lines(items)
+    menu = order_menu(state)
+    if menu is not None:
+        problems = validate_lines(lines, menu.catalog)
+        if problems:
+            raise ValueError("; ".join(problems))
+
+    existing = {line_key(item["code"], item.get("options")): item for item in state["items"]}
+    for line in lines:
+        item = existing.get(line_key(line["code"], line["options"]))
+        if item is not None:
+            item["quantity"] += line["quantity"]
+            continue
+        item = {"code": line["code"], "quantity": line["quantity"]}
+        if line["options"]:
+            item["options"] = line["options"]
+        item.update(extra or {})
+        state["items"].append(item)
+    return "Added " + ", ".join(f"{line['quantity']}x {line['code']}" for line in lines) + " to order"
+
+
+def add_item(state: Dict[str, Any], item_code: str, quantity: int = 1, extra: Optional[Dict[str, Any]] = None) -> str:
+    """add_to_order: one line, checked and merged like add_lines"""
+    return add_lines(state, [{"item_code": item_code, "quantity": quantity}], extra)
+
+
+def view_order_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """view_order result: the cart, priced from the order's cached menu when there is one"""
+    result = {
+        "items": state["items"],
+        "item_count": len(state["items"])
+    }
+    menu = order_menu(state)
+    if menu is not None:
+        result["estimate"] = estimate_order(state["items"], menu, state.get("store")).to_dict()
+    return result
@@ -0,0 +1,200 @@
+"""
+MCPizza circuit breakers
+
+One breaker per upstream endpoint (store locator, store profile, menu,
+pricing, placement). A breaker watches the outcome and duration of the last
+calls and opens when too many of them fail or run slow; while open, calls
+are rejected immediately with CircuitOpen instead of waiting for another
+timeout, so callers with mock data fall back at once. After a cool-down the
+breaker lets a few probe calls through (half-open) and closes again when
+they all succeed.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("mcpizza")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_SLOW_CALL_RATE = 0.8
+DEFAULT_SLOW_CALL_SECONDS = 10.0
+DEFAULT_WINDOW = 20
+DEFAULT_MIN_CALLS = 10
+DEFAULT_OPEN_SECONDS = 30.0
+DEFAULT_HALF_OPEN_PROBES = 3
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream endpoint whose breaker is open"""
+
+
+class CircuitBreaker:
+    """Failure-rate and slow-call-rate breaker over a sliding window of calls"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = DEFAULT_FAILURE_RATE,
+        slow_call_rate: float = DEFAULT_SLOW_CALL_RATE,
+        slow_call_seconds: float = DEFAULT_SLOW_CALL_SECONDS,
+        window: int = DEFAULT_WINDOW,
+        min_calls: int = DEFAULT_MIN_CALLS,
+        open_seconds: float = DEFAULT_OPEN_SECONDS,
+        half_open_probes: int = DEFAULT_HALF_OPEN_PROBES,
+        is_failure: Callable[[BaseException], bool] = lambda e: True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.is_failure = is_failure
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (failed, slow) per recent call
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._calls:
+            return 0.0, 0.0
+        failed = sum(1 for f, _ in self._calls if f)
+        slow = sum(1 for _, s in self._calls if s)
+        return failed / len(self._calls), slow / len(self._calls)
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self.opened += 1
+        logger.warning(f"Circuit {self.name} opened ({reason}); rejecting calls for {self.open_seconds:g}s")
+
+    def before(self) -> None:
+        """Admit a call or raise CircuitOpen"""
+        with self._lock:
+            now = self._clock()
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probes_started = 0
+                self._probes_passed = 0
+            if self.state == HALF_OPEN and self._probes_started < self.half_open_probes:
+                self._probes_started += 1
+                return
+            if self.state == CLOSED:
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.open_seconds - (now - self._opened_at))
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+    def record(self, failed: bool, elapsed: float) -> None:
+        """Record the outcome of an admitted call"""
+        slow = elapsed >= self.slow_call_seconds
+        with self._lock:
+            now = self._clock()
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._open(now, "probe call failed" if failed else "probe call was slow")
+                    return
+                self._probes_passed += 1
+                if self._probes_passed >= self.half_open_probes:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"Circuit {self.name} closed")
+                return
+            if self.state == OPEN:
+                # A call admitted before the breaker opened
+                return
+            self._calls.append((failed, slow))
+            if len(self._calls) >= self.min_calls:
+                failure_rate, slow_rate = self._rates()
+                if failure_rate >= self.failure_rate or slow_rate >= self.slow_call_rate:
+                    self._open(now, f"failure rate {failure_rate:.0%}, slow call rate {slow_rate:.0%}")
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Admit, time and record the call made inside the with block"""
+        self.before()
+        start = self._clock()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self._cancelled()
+            raise
+        except BaseException as e:
+            self.record(self.is_failure(e), self._clock() - start)
+            raise
+        self.record(False, self._clock() - start)
+
+    def _cancelled(self) -> None:
+        # A cancelled call (such as the losing half of a hedged request) says
+        # nothing about the endpoint; give back its probe slot
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_started > 0:
+                self._probes_started -= 1
+
+    def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self.guard():
+            return fn(*args)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            failure_rate, slow_rate = self._rates()
+            return {
+                "state": self.state,
+                "calls": len(self._calls),
+                "failure_rate": round(failure_rate, 3),
+                "slow_call_rate": round(slow_rate, 3),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+def breaker_from_env(name: str, is_failure: Optional[Callable[[BaseException], bool]] = None) -> CircuitBreaker:
+    """Build a CircuitBreaker configured from MCPIZZA_BREAKER_* environment variables"""
+    return CircuitBreaker(
+        name,
+        failure_rate=float(os.getenv("MCPIZZA_BREAKER_FAILURE_RATE", DEFAULT_FAILURE_RATE)),
+        slow_call_rate=float(os.getenv("MCPIZZA_BREAKER_SLOW_CALL_RATE", DEFAULT_SLOW_CALL_RATE)),
+        slow_call_seconds=float(os.getenv("MCPIZZA_BREAKER_SLOW_CALL_SECONDS", DEFAULT_SLOW_CALL_SECONDS)),
+        window=int(os.getenv("MCPIZZA_BREAKER_WINDOW", DEFAULT_WINDOW)),
+        min_calls=int(os.getenv("MCPIZZA_BREAKER_MIN_CALLS", DEFAULT_MIN_CALLS)),
+        open_seconds=float(os.getenv("MCPIZZA_BREAKER_OPEN_SECONDS", DEFAULT_OPEN_SECONDS)),
+        half_open_probes=int(os.getenv("MCPIZZA_BREAKER_HALF_OPEN_PROBES", DEFAULT_HALF_OPEN_PROBES)),
+        **({"is_failure": is_failure} if is_failure else {}),
+    )
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, is_failure: Optional[Callable[[BaseException], bool]] = None) -> CircuitBreaker:
+    """The shared breaker for an upstream endpoint, created on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = breaker_from_env(name, is_failure)
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
@@ -0,0 +1,144 @@
+"""
+MCPizza upstream bulkheads
+
+Separate concurrency limits for each kind of Domino's call (store locator,
+menu, pricing, placement) so a burst of one kind can't use up the
+connections and workers the others need: slow menu downloads queue behind
+other menu downloads, never in front of place_order. Each bulkhead admits
+a fixed number of concurrent calls, queues a bounded number more, and
+rejects anything beyond that immediately with BulkheadFull.
+
+Bulkheads are thread-safe and can be waited on from any event loop.
+"""
+
+import asyncio
+import os
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Tuple
+
+# name: (concurrent calls, queued calls); the concurrency limits add up to
+# MCPIZZA_DOMINOS_MAX_CONNECTIONS so no group waits on another for a connection
+DEFAULT_LIMITS: Dict[str, Tuple[int, int]] = {
+    "locator": (6, 24),
+    "menu": (4, 16),
+    "pricing": (6, 24),
+    "placement": (4, 16),
+}
+
+
+class BulkheadFull(Exception):
+    """Raised when a bulkhead's concurrency and queue are both used up"""
+
+
+class Bulkhead:
+    """Concurrency limit with a bounded FIFO queue"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    async def _acquire(self) -> None:
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self.admitted += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise BulkheadFull(
+                    f"Too many concurrent {self.name} requests "
+                    f"({self.max_concurrent} running, {len(self._waiters)} queued)"
+                )
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+            self.queued += 1
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # Already handed a slot: if the hand-off landed, pass it on here,
+            # otherwise _wake sees the cancelled future and passes it on
+            if not waiter[1].cancelled():
+                self._release()
+            raise
+        with self._lock:
+            self.admitted += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self._active -= 1
+                return
+            # Hand the slot straight to the next waiter
+            loop, future = self._waiters.popleft()
+        loop.call_soon_threadsafe(self._wake, future)
+
+    def _wake(self, future: "asyncio.Future[None]") -> None:
+        if future.done():
+            self._release()
+        else:
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the bulkhead's slots, waiting in the queue if needed"""
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+            }
+
+
+def bulkhead_from_env(name: str) -> Bulkhead:
+    """Build a Bulkhead configured from MCPIZZA_BULKHEAD_<NAME>_CONCURRENCY / _QUEUE"""
+    concurrency, queue = DEFAULT_LIMITS.get(name, (4, 16))
+    prefix = f"MCPIZZA_BULKHEAD_{name.upper()}"
+    return Bulkhead(
+        name,
+        max_concurrent=int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", queue)),
+    )
+
+
+_bulkheads: Dict[str, Bulkhead] = {}
+_bulkheads_lock = threading.Lock()
+
+
+def get_bulkhead(name: str) -> Bulkhead:
+    """The shared bulkhead for a kind of upstream call, created on first use"""
+    with _bulkheads_lock:
+        bulkhead = _bulkheads.get(name)
+        if bulkhead is None:
+            bulkhead = _bulkheads[name] = bulkhead_from_env(name)
+        return bulkhead
+
+
+def bulkhead_stats() -> Dict[str, Dict[str, Any]]:
+    with _bulkheads_lock:
+        bulkheads = list(_bulkheads.values())
+    return {bulkhead.name: bulkhead.stats() for bulkhead in bulkheads}
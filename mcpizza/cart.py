@@ -0,0 +1,113 @@
+"""
+MCPizza cart lines
+
+Parsing for add_items_to_order, which adds many items in one call. Lines
+for the same item with the same options are merged into one line with the
+summed quantity, so a 40-pizza catering order is a single line with
+quantity 40 rather than 40 products, and the whole request is checked
+before anything is added.
+
+Carts are versioned so view_order can answer with just what changed since
+the version a client last saw.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Set
+
+MAX_ORDER_LINES = 50
+MAX_LINE_QUANTITY = 100
+
+
+def line_key(code: str, options: Dict[str, Any]) -> str:
+    """Identity of a cart line: its code plus canonical options"""
+    return code + json.dumps(options or {}, sort_keys=True, separators=(",", ":"))
+
+
+def parse_lines(items: Any) -> List[Dict[str, Any]]:
+    """Validate and merge [{"item_code", "quantity", "options"}] into {"code", "quantity", "options"} lines
+
+    Raises ValueError listing every malformed line.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list of {item_code, quantity, options} objects")
+    if len(items) > MAX_ORDER_LINES:
+        raise ValueError(f"At most {MAX_ORDER_LINES} lines can be added at once, got {len(items)}")
+
+    problems: List[str] = []
+    merged: Dict[str, Dict[str, Any]] = {}
+    for number, item in enumerate(items, 1):
+        if not isinstance(item, dict) or not isinstance(item.get("item_code"), str) or not item["item_code"]:
+            problems.append(f"Line {number}: item_code is required")
+            continue
+        quantity = item.get("quantity", 1)
+        options = item.get("options") or {}
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or not 1 <= quantity <= MAX_LINE_QUANTITY:
+            problems.append(f"Line {number} ({item['item_code']}): quantity must be a whole number from 1 to {MAX_LINE_QUANTITY}")
+            continue
+        if not isinstance(options, dict):
+            problems.append(f"Line {number} ({item['item_code']}): options must be an object of topping codes")
+            continue
+        key = line_key(item["item_code"], options)
+        line = merged.get(key)
+        if line is None:
+            merged[key] = {"code": item["item_code"], "quantity": quantity, "options": options}
+        else:
+            line["quantity"] += quantity
+    if problems:
+        raise ValueError("\n".join(problems))
+    return list(merged.values())
+
+
+def validate_lines(lines: List[Dict[str, Any]], catalog: Any) -> List[str]:
+    """Catalog problems of every line (prefixed with its code when there are several); empty when all are valid"""
+    return [
+        f"{line['code']}: {problem}" if len(lines) > 1 else problem
+        for line in lines
+        for problem in catalog.validate(line["code"], line["options"])
+    ]
+
+
+def parse_version(value: Any) -> Optional[int]:
+    """view_order's since_version as an int (a JSON number or digit string); None when not given
+
+    Raises ValueError for anything that isn't a whole number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)
+    raise ValueError(f"since_version must be a whole number, got {value!r}")
+
+
+def compact_line(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Short form of a cart line for view_order: options only when set"""
+    line = {"code": item["code"], "qty": item["quantity"]}
+    if item.get("options"):
+        line["options"] = item["options"]
+    return line
+
+
+class CartVersions:
+    """A cart's version number and the version each part of it last changed at
+
+    view_order clients pass back the version they last saw and get only the
+    lines changed since.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._changed: Dict[str, int] = {}
+
+    def bump(self, *keys: str) -> int:
+        """Start a new version, recording the keys (line keys, "store", ...) it changed"""
+        self.version += 1
+        for key in keys:
+            self._changed[key] = self.version
+        return self.version
+
+    def changed_since(self, version: int) -> Set[str]:
+        return {key for key, changed in self._changed.items() if changed > version}
@@ -0,0 +1,162 @@
+"""
+MCPizza option catalog
+
+Indexes the orderable codes of a store menu (variants, with the products,
+sizes, crusts and toppings they refer to) so add_to_order can reject bad
+item or topping codes locally, with suggestions, instead of failing later
+at pricing or placement.
+"""
+
+import difflib
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .menu_table import MenuTable, iter_menu_products, parse_price
+
+MAX_SUGGESTIONS = 3
+
+
+def _named_codes(section: Any) -> Dict[str, str]:
+    """Flatten a {product_type: {code: {"Name": ...}}} menu section to {code: name}"""
+    codes: Dict[str, str] = {}
+    if isinstance(section, dict):
+        for entries in section.values():
+            if isinstance(entries, dict):
+                for code, entry in entries.items():
+                    if isinstance(entry, dict):
+                        codes[sys.intern(code)] = sys.intern(str(entry.get("Name", code)))
+    return codes
+
+
+def parse_available_toppings(value: Any) -> Optional[Set[str]]:
+    """Topping codes from an AvailableToppings string like "X=0:0.5:1,C=0:1,P=1/1,1/2"
+
+    Returns None when the product doesn't restrict its toppings.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    return {part.split("=", 1)[0].strip() for part in value.split(",") if "=" in part}
+
+
+def iter_product_entries(menu_data: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """(code, product dict) pairs from the top-level Products section and every category"""
+    products = menu_data.get("Products")
+    if isinstance(products, dict):
+        for code, product in products.items():
+            if isinstance(product, dict):
+                yield code, product
+    for _, code, product in iter_menu_products(menu_data):
+        yield code, product
+
+
+class Variant:
+    """An orderable variant of a product (one size and crust)"""
+
+    __slots__ = ("code", "product_code", "name", "size_code", "flavor_code", "price")
+
+    def __init__(self, code: str, product_code: str, name: str, size_code: str, flavor_code: str,
+                 price: float = 0.0):
+        self.code = code
+        self.product_code = product_code
+        self.name = name
+        self.size_code = size_code
+        self.flavor_code = flavor_code
+        self.price = price
+
+
+class OptionCatalog:
+    """Item and option codes a store will accept"""
+
+    def __init__(self):
+        self.variants: Dict[str, Variant] = {}
+        self.products: Set[str] = set()
+        self.sizes: Dict[str, str] = {}
+        self.crusts: Dict[str, str] = {}
+        self.toppings: Dict[str, str] = {}
+        self.allowed_toppings: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def from_menu(cls, menu_data: Dict[str, Any], table: MenuTable) -> "OptionCatalog":
+        """Build from raw menu data (Variants/Toppings/Sizes/Flavors sections) and its table"""
+        catalog = cls()
+        catalog.products.update(product.code for product in table)
+        catalog.sizes = _named_codes(menu_data.get("Sizes"))
+        catalog.crusts = _named_codes(menu_data.get("Flavors"))
+        catalog.toppings = _named_codes(menu_data.get("Toppings"))
+
+        variants = menu_data.get("Variants")
+        if isinstance(variants, dict):
+            for code, variant in variants.items():
+                if isinstance(variant, dict):
+                    catalog.variants[code] = Variant(
+                        code=code,
+                        product_code=variant.get("ProductCode", ""),
+                        name=variant.get("Name", code),
+                        size_code=variant.get("SizeCode", ""),
+                        flavor_code=variant.get("FlavorCode", ""),
+                        price=parse_price(variant.get("Price", "")),
+                    )
+
+        for code, product in iter_product_entries(menu_data):
+            allowed = parse_available_toppings(product.get("AvailableToppings"))
+            if allowed is not None:
+                catalog.allowed_toppings[code] = allowed
+        return catalog
+
+    def __contains__(self, item_code: str) -> bool:
+        # Only variants can be ordered; a product code names all its sizes and crusts
+        return item_code in self.variants
+
+    def variants_of(self, product_code: str) -> List[str]:
+        """Variant codes of a product (only used on the error path)"""
+        return [code for code, variant in self.variants.items() if variant.product_code == product_code]
+
+    def describe(self, item_code: str) -> str:
+        """Human-readable size and crust of a variant code, or "" if unknown"""
+        variant = self.variants.get(item_code)
+        if variant is None:
+            return ""
+        parts = [self.sizes.get(variant.size_code, ""), self.crusts.get(variant.flavor_code, "")]
+        return " ".join(part for part in parts if part) or variant.name
+
+    def suggest(self, code: str, candidates: Iterable[str]) -> List[str]:
+        """Closest known codes to a bad one (only used on the error path)"""
+        return difflib.get_close_matches(code.upper(), list(candidates), n=MAX_SUGGESTIONS, cutoff=0.5)
+
+    def validate(self, item_code: str, options: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Problems with an item code and its topping options; empty when the item is valid"""
+        problems: List[str] = []
+        if item_code not in self:
+            variants = self.variants_of(item_code) if item_code in self.products else []
+            if variants:
+                shown = ", ".join(f"{code} ({self.describe(code)})" for code in variants[:8])
+                message = f"'{item_code}' is a product, not an orderable item. Order one of its variants: {shown}"
+                if len(variants) > 8:
+                    message += f" (+{len(variants) - 8} more)"
+            elif item_code in self.products:
+                message = f"'{item_code}' is a product with no orderable variant on this menu"
+            else:
+                message = f"Unknown item code '{item_code}'"
+                suggestions = self.suggest(item_code, self.variants)
+                if suggestions:
+                    message += f". Did you mean: {', '.join(suggestions)}?"
+            problems.append(message)
+            return problems
+
+        if not options or not self.toppings:
+            return problems
+        if not isinstance(options, dict):
+            return [f"Options must be an object of topping codes, got {type(options).__name__}"]
+
+        allowed = self.allowed_toppings.get(self.variants[item_code].product_code)
+        for topping_code in options:
+            if topping_code not in self.toppings:
+                message = f"Unknown topping code '{topping_code}'"
+                suggestions = self.suggest(topping_code, self.toppings)
+                if suggestions:
+                    message += f". Did you mean: {', '.join(f'{code} ({self.toppings[code]})' for code in suggestions)}?"
+                problems.append(message)
+            elif allowed is not None and topping_code not in allowed:
+                problems.append(f"Topping '{topping_code}' ({self.toppings[topping_code]}) is not available on {item_code}")
+        return problems
+
@@ -0,0 +1,202 @@
+"""
+MCPizza coupon catalog
+
+Indexes the Coupons section of a store menu by code, together with what
+each coupon requires of the cart (product groups and quantities, service
+method, minimum order). It is built with the menu and cached with it, so
+apply_coupon can tell whether a coupon applies to the current cart, and
+roughly what it saves, without a Domino's price call.
+
+Requirements are only as complete as the menu data: a coupon whose entry
+lists no product groups is treated as applying to any cart. Each cart unit
+counts toward at most one requirement of a coupon. Codes are matched
+case-insensitively.
+"""
+
+import difflib
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .menu_table import parse_price
+from .pricing import unit_price
+
+MAX_SUGGESTIONS = 3
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return [value]
+
+
+class CouponRequirement:
+    """At least quantity items whose code (or variant's product code) is in codes"""
+
+    __slots__ = ("codes", "quantity")
+
+    def __init__(self, codes: Set[str], quantity: int):
+        self.codes = codes
+        self.quantity = quantity
+
+    def describe(self) -> str:
+        codes = sorted(self.codes)
+        shown = ", ".join(codes[:5]) + (f" (+{len(codes) - 5} more)" if len(codes) > 5 else "")
+        return f"{self.quantity}x of {shown}"
+
+
+class Coupon:
+    """One coupon from a store menu"""
+
+    __slots__ = ("code", "name", "price", "requirements", "service_methods", "minimum_amount")
+
+    def __init__(
+        self,
+        code: str,
+        name: str,
+        price: Optional[float],
+        requirements: List[CouponRequirement],
+        service_methods: Set[str],
+        minimum_amount: float = 0.0,
+    ):
+        self.code = code
+        self.name = name
+        self.price = price
+        self.requirements = requirements
+        self.service_methods = service_methods
+        self.minimum_amount = minimum_amount
+
+    @classmethod
+    def from_menu_entry(cls, code: str, entry: Dict[str, Any]) -> "Coupon":
+        tags = entry.get("Tags") if isinstance(entry.get("Tags"), dict) else {}
+        requirements = []
+        for group in _as_list(entry.get("ProductGroups")):
+            if isinstance(group, dict):
+                codes = {sys.intern(str(code)) for code in _as_list(group.get("ProductCodes"))}
+                quantity = int(group.get("RequiredQty") or group.get("Quantity") or 1)
+                if codes:
+                    requirements.append(CouponRequirement(codes, quantity))
+        price = parse_price(entry.get("Price", ""))
+        return cls(
+            code=code,
+            name=str(entry.get("Name", code)),
+            price=price or None,
+            requirements=requirements,
+            service_methods={str(method) for method in _as_list(tags.get("ValidServiceMethods"))},
+            minimum_amount=parse_price(tags.get("MinimumOrderAmount") or entry.get("MinimumOrderAmount") or 0),
+        )
+
+
+def normalize_code(code: str) -> str:
+    """Coupon codes are matched case-insensitively"""
+    return code.strip().upper()
+
+
+def _units(items: Iterable[Dict[str, Any]], menu: Any) -> List[Tuple[Optional[float], Set[str]]]:
+    """(unit price, codes it can match: its own and its variant's product code) of every cart unit"""
+    units = []
+    for item in items:
+        code = item["code"]
+        variant = menu.catalog.variants.get(code)
+        codes = {code} if variant is None else {code, variant.product_code}
+        units.extend([(unit_price(menu, code), codes)] * int(item.get("quantity", 1)))
+    return units
+
+
+def _allocate(units: List[Tuple[Optional[float], Set[str]]],
+              requirements: List[CouponRequirement]) -> Tuple[List[Optional[float]], List[str]]:
+    """Give each requirement its own cart units; returns the covered unit prices and unmet requirements
+
+    The requirements with the fewest qualifying units choose first, taking
+    the units fewest other requirements could use (the most expensive
+    among equals), so one unit never satisfies two requirements.
+    """
+    qualifying = [[i for i, (_, codes) in enumerate(units) if codes & requirement.codes] for requirement in requirements]
+    demand = [sum(1 for candidates in qualifying if i in candidates) for i in range(len(units))]
+    used: Set[int] = set()
+    covered: List[Optional[float]] = []
+    problems: Dict[int, str] = {}
+    for r in sorted(range(len(requirements)), key=lambda r: len(qualifying[r])):
+        requirement = requirements[r]
+        free = [i for i in qualifying[r] if i not in used]
+        if len(free) < requirement.quantity:
+            shared = len(qualifying[r]) - len(free)
+            problems[r] = f"Needs {requirement.describe()} (cart has {len(free)}" + (
+                f", plus {shared} already counted toward another requirement)" if shared else ")"
+            )
+            continue
+        free.sort(key=lambda i: (demand[i], -(units[i][0] or 0.0)))
+        chosen = free[:requirement.quantity]
+        used.update(chosen)
+        covered.extend(units[i][0] for i in chosen)
+    return covered, [problems[r] for r in sorted(problems)]
+
+
+class CouponCheck:
+    """Whether a coupon applies to a cart, and what it would roughly save"""
+
+    def __init__(self, coupon: Coupon, problems: List[str], savings: Optional[float]):
+        self.coupon = coupon
+        self.problems = problems
+        self.savings = savings
+
+    @property
+    def eligible(self) -> bool:
+        return not self.problems
+
+
+class CouponCatalog:
+    """A store's coupons by code"""
+
+    def __init__(self):
+        self.coupons: Dict[str, Coupon] = {}
+
+    @classmethod
+    def from_menu(cls, menu_data: Dict[str, Any]) -> "CouponCatalog":
+        catalog = cls()
+        section = menu_data.get("Coupons")
+        if isinstance(section, dict):
+            for code, entry in section.items():
+                if isinstance(entry, dict):
+                    catalog.coupons[sys.intern(normalize_code(code))] = Coupon.from_menu_entry(code, entry)
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.coupons)
+
+    def __contains__(self, code: str) -> bool:
+        return normalize_code(code) in self.coupons
+
+    def get(self, code: str) -> Optional[Coupon]:
+        return self.coupons.get(normalize_code(code))
+
+    def suggest(self, code: str) -> List[str]:
+        """Closest known coupon codes to an unknown one"""
+        matches = difflib.get_close_matches(normalize_code(code), list(self.coupons), n=MAX_SUGGESTIONS, cutoff=0.5)
+        return [self.coupons[match].code for match in matches]
+
+    def check(self, code: str, items: List[Dict[str, Any]], menu: Any, service_method: str = "Delivery",
+              subtotal: Optional[float] = None) -> CouponCheck:
+        """Check a known coupon against a cart ({"code", "quantity"} lines) priced from menu
+
+        Savings are the list price of the units allocated to the coupon's
+        requirements less the coupon's price; None when the
+        coupon has no fixed price or a covered unit has no menu price.
+        """
+        coupon = self.coupons[normalize_code(code)]
+        problems = []
+        if coupon.service_methods and service_method not in coupon.service_methods:
+            problems.append(f"Only valid for {' or '.join(sorted(coupon.service_methods))} orders")
+        if coupon.minimum_amount and subtotal is not None and subtotal < coupon.minimum_amount:
+            problems.append(f"Needs an order of at least ${coupon.minimum_amount:.2f} (cart is ${subtotal:.2f})")
+
+        covered, unmet = _allocate(_units(items, menu), coupon.requirements)
+        problems.extend(unmet)
+
+        savings = None
+        if not problems and coupon.price is not None and covered and None not in covered:
+            savings = round(max(0.0, sum(covered) - coupon.price), 2)
+        return CouponCheck(coupon, problems, savings)
@@ -0,0 +1,388 @@
+"""
+MCPizza Domino's client
+
+An async client for the Domino's ordering endpoints the tools use (store
+locator, store profile, menu, price and place) built on one shared httpx
+connection pool. Connections are kept alive between requests, so DNS
+lookups and TCP/TLS handshakes are paid once per pooled connection rather
+than once per request as with pizzapi's plain requests calls.
+
+The client runs on its own event loop thread so it can be shared by the
+async MCP handlers (through call()) and by synchronous code such as cache
+loaders and the api/ handlers (through call_sync()).
+
+Each request has one deadline (MCPIZZA_UPSTREAM_TIMEOUT by default) that
+covers all of its retries, and each attempt gets at most
+MCPIZZA_DOMINOS_ATTEMPT_TIMEOUT seconds of what is left, so a retry after
+a timed-out attempt still answers within the caller's timeout.
+
+Each endpoint has its own circuit breaker (see breaker.py): timeouts,
+connection errors and 5xx responses count against it, rejected requests
+(4xx) do not. Every endpoint except order placement is retried on such
+failures and, when hedging is enabled, hedged at its p95 latency (see
+retry.py). Requests are admitted through per-kind bulkheads (see
+bulkhead.py) so locator, menu, pricing and placement traffic can't starve
+each other.
+
+ClientStore mimics the parts of pizzapi's Store the rest of the package
+uses (data, id, get_details, get_menu), so the caches work unchanged, and
+ClientOrder the parts of pizzapi's Order (data, set_customer, add_item)
+without its menu download.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+from .breaker import CircuitOpen, get_breaker
+from .bulkhead import BulkheadFull, get_bulkhead
+from .retry import DEFAULT_HEDGE_PERCENTILE, LatencyTracker, RetryPolicy, hedge, retry, retry_policy_from_env
+from .upstream import PLACE_ORDER_TIMEOUT, UPSTREAM_TIMEOUT, UpstreamTimeout
+
+DEFAULT_BASE_URL = "https://order.dominos.com"
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_SECONDS = 60.0
+DEFAULT_ATTEMPT_TIMEOUT_SECONDS = 8.0
+ORDER_REFERER = "https://order.dominos.com/en/pages/order/"
+
+# Bulkhead each endpoint's requests are admitted through
+ENDPOINT_BULKHEADS = {
+    "locator": "locator",
+    "profile": "locator",
+    "menu": "menu",
+    "price": "pricing",
+    "place": "placement",
+}
+
+
+class DominosError(Exception):
+    """Raised when Domino's rejects a request or returns an unexpected response"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether an error means the endpoint is unhealthy, as opposed to rejecting our request"""
+    if isinstance(error, DominosError) and error.status is not None:
+        return error.status >= 500
+    return not isinstance(error, (CircuitOpen, BulkheadFull))
+
+
+def split_address(address: str) -> Tuple[str, str]:
+    """Store locator (street, city/region/ZIP) lines for a free-form address
+
+    "123 Main St, Springfield, IL 62704" splits at the first comma; an
+    address without commas (such as a bare ZIP code) is sent as line two.
+    """
+    street, comma, locality = address.partition(",")
+    if not comma:
+        return "", address.strip()
+    return street.strip(), locality.strip()
+
+
+class DominosClient:
+    """Async Domino's API client sharing one keep-alive connection pool"""
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        timeout: float = UPSTREAM_TIMEOUT,
+        attempt_timeout: float = DEFAULT_ATTEMPT_TIMEOUT_SECONDS,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_SECONDS,
+        retry_policy: Optional[RetryPolicy] = None,
+        hedge_percentile: Optional[float] = None,
+    ):
+        if not HTTPX_AVAILABLE:
+            raise DominosError("httpx is required for the Domino's client. Install with: pip install httpx")
+        self.base_url = base_url
+        # Deadline of a whole request including retries, and the longest one attempt may take
+        self.timeout = timeout
+        self.attempt_timeout = attempt_timeout
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.retry_policy = retry_policy or RetryPolicy()
+        # None disables hedging
+        self.hedge_percentile = hedge_percentile
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._http: Optional["httpx.AsyncClient"] = None
+
+    def _client(self) -> "httpx.AsyncClient":
+        # Created lazily so it binds to the loop that first uses it
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                headers={"Accept": "application/json"},
+            )
+        return self._http
+
+    async def _request(self, endpoint: str, method: str, path: str, timeout: Optional[float] = None,
+                       idempotent: bool = True, **kwargs: Any) -> Dict[str, Any]:
+        """Send a request, retried and hedged unless it isn't idempotent, all within timeout seconds"""
+        budget = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget
+
+        def attempt() -> Awaitable[Dict[str, Any]]:
+            remaining = max(deadline - loop.time(), 0.0)
+            return self._attempt(endpoint, method, path, min(self.attempt_timeout, remaining) if idempotent else remaining, **kwargs)
+
+        if idempotent:
+            latency = self._latency.setdefault(endpoint, LatencyTracker())
+            delay = None if self.hedge_percentile is None else latency.percentile(self.hedge_percentile)
+            request = retry(lambda: hedge(attempt, delay), self.retry_policy, is_upstream_failure, deadline)
+        else:
+            request = attempt()
+        try:
+            # Also bounds time spent waiting for a bulkhead slot
+            return await asyncio.wait_for(request, budget)
+        except asyncio.TimeoutError:
+            raise UpstreamTimeout(f"{method} {path} timed out after {budget:g}s")
+
+    async def _attempt(self, endpoint: str, method: str, path: str, timeout: Optional[float],
+                       **kwargs: Any) -> Dict[str, Any]:
+        async with get_bulkhead(ENDPOINT_BULKHEADS[endpoint]).slot():
+            return await self._send(endpoint, method, path, timeout, **kwargs)
+
+    async def _send(self, endpoint: str, method: str, path: str, timeout: Optional[float],
+                    **kwargs: Any) -> Dict[str, Any]:
+        with get_breaker(endpoint, is_upstream_failure).guard():
+            start = time.monotonic()
+            try:
+                response = await self._client().request(method, path, timeout=timeout, **kwargs)
+                response.raise_for_status()
+                payload = response.json()
+                self._latency.setdefault(endpoint, LatencyTracker()).add(time.monotonic() - start)
+                return payload
+            except httpx.TimeoutException as e:
+                raise UpstreamTimeout(f"{method} {path} timed out: {e}")
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                raise DominosError(f"{method} {path} failed with HTTP {status}", status=status)
+            except httpx.TransportError as e:
+                raise DominosError(f"{method} {path} failed: {e}")
+            except ValueError as e:
+                raise DominosError(f"{method} {path} returned invalid JSON: {e}")
+
+    async def find_stores(self, address: str, service: str = "Delivery") -> List[Dict[str, Any]]:
+        """Store data of nearby stores that are online and open for a service, nearest first"""
+        line1, line2 = split_address(address)
+        payload = await self._request("locator", "GET", "/power/store-locator", params={"s": line1, "c": line2, "type": service})
+        return [
+            store for store in payload.get("Stores", [])
+            if store.get("IsOnlineNow") and store.get("ServiceIsOpen", {}).get(service)
+        ]
+
+    async def store_profile(self, store_id: Any) -> Dict[str, Any]:
+        return await self._request("profile", "GET", f"/power/store/{store_id}/profile")
+
+    async def store_menu(self, store_id: Any, lang: str = "en") -> Dict[str, Any]:
+        return await self._request("menu", "GET", f"/power/store/{store_id}/menu", params={"lang": lang, "structured": "true"})
+
+    async def price_order(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._post_order("price", "/power/price-order", order_data)
+
+    async def place_order(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        # Never retried: a duplicate could place the order twice
+        return await self._post_order("place", "/power/place-order", order_data, timeout=PLACE_ORDER_TIMEOUT,
+                                      idempotent=False)
+
+    async def _post_order(self, endpoint: str, path: str, order_data: Dict[str, Any],
+                          timeout: Optional[float] = None, idempotent: bool = True) -> Dict[str, Any]:
+        return await self._request(endpoint, "POST", path, timeout=timeout, idempotent=idempotent, json={"Order": order_data}, headers={"Referer": ORDER_REFERER})
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class _ClientLoop:
+    """Event loop thread that owns the shared client"""
+
+    def __init__(self, client: DominosClient):
+        self.client = client
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="mcpizza-dominos", daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine: Awaitable[Any]) -> Future:
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("Domino's client calls must not block the client loop")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+_client_loop: Optional[_ClientLoop] = None
+_client_loop_lock = threading.Lock()
+
+
+def _get_client_loop() -> _ClientLoop:
+    global _client_loop
+    with _client_loop_lock:
+        if _client_loop is None:
+            _client_loop = _ClientLoop(DominosClient(
+                base_url=os.getenv("MCPIZZA_DOMINOS_BASE_URL", DEFAULT_BASE_URL),
+                max_connections=int(os.getenv("MCPIZZA_DOMINOS_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+                keepalive_expiry=float(os.getenv("MCPIZZA_DOMINOS_KEEPALIVE", DEFAULT_KEEPALIVE_SECONDS)),
+                attempt_timeout=float(os.getenv("MCPIZZA_DOMINOS_ATTEMPT_TIMEOUT", DEFAULT_ATTEMPT_TIMEOUT_SECONDS)),
+                retry_policy=retry_policy_from_env(),
+                hedge_percentile=(
+                    float(os.getenv("MCPIZZA_HEDGE_PERCENTILE", DEFAULT_HEDGE_PERCENTILE))
+                    if os.getenv("MCPIZZA_HEDGE", "false").lower() == "true" else None
+                ),
+            ))
+        return _client_loop
+
+
+def get_dominos_client() -> DominosClient:
+    """The shared client; its coroutines must be run through call() or call_sync()"""
+    return _get_client_loop().client
+
+
+async def call(coroutine: Awaitable[Any]) -> Any:
+    """Await a client coroutine from any event loop"""
+    return await asyncio.wrap_future(_get_client_loop().submit(coroutine))
+
+
+def call_sync(coroutine: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """Run a client coroutine from synchronous code (not from inside an event loop)
+
+    Raises UpstreamTimeout, and cancels the coroutine, if it hasn't finished
+    within timeout seconds (MCPIZZA_UPSTREAM_TIMEOUT by default).
+    """
+    timeout = UPSTREAM_TIMEOUT if timeout is None else timeout
+    future = _get_client_loop().submit(coroutine)
+    try:
+        return future.result(timeout)
+    except FutureTimeout:
+        future.cancel()
+        raise UpstreamTimeout(f"Domino's request timed out after {timeout:g}s")
+
+
+class ClientMenu:
+    """Raw menu payload, shaped like the pizzapi Menu the caches consume"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.variants = data.get("Variants", {})
+
+
+class ClientStore:
+    """pizzapi Store look-alike whose requests go through the shared client"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.id = str(data.get("StoreID", -1))
+        self.data = data
+
+    def get_details(self) -> Dict[str, Any]:
+        return call_sync(get_dominos_client().store_profile(self.id))
+
+    def get_menu(self, lang: str = "en") -> ClientMenu:
+        return ClientMenu(call_sync(get_dominos_client().store_menu(self.id, lang)))
+
+
+class ClientOrder:
+    """pizzapi Order look-alike built from the store alone
+
+    pizzapi's Order downloads the store's menu when it is created, outside
+    the pooled client and the menu cache. Products are added by code here,
+    after being checked against the cached menu, and the order is priced
+    and placed through the shared client.
+    """
+
+    def __init__(self, store: Any, service_method: str = "Delivery"):
+        self.store = store
+        self.customer = None
+        self.data: Dict[str, Any] = {
+            "Address": {}, "Coupons": [], "CustomerID": "", "Extension": "",
+            "OrderChannel": "OLO", "OrderID": "", "NoCombine": True,
+            "OrderMethod": "Web", "OrderTaker": None, "Payments": [],
+            "Products": [], "Market": "", "Currency": "",
+            "ServiceMethod": service_method, "Tags": {}, "Version": "1.0",
+            "SourceOrganizationURI": "order.dominos.com", "LanguageCode": "en",
+            "Partners": {}, "NewUser": True, "metaData": {}, "Amounts": {},
+            "BusinessDate": "", "EstimatedWaitMinutes": "",
+            "PriceOrderTime": "", "AmountsBreakdown": {},
+        }
+
+    def set_customer(self, customer: Any, address: Optional[Dict[str, Any]] = None) -> None:
+        """Customer the order is for; address is {Street, City, Region, PostalCode}"""
+        self.customer = customer
+        if address is not None:
+            self.data["Address"] = {**address, "Type": "House"}
+
+    def add_item(self, code: str, qty: int = 1) -> Dict[str, Any]:
+        """Append a product line for a variant code and return it"""
+        product = {"Code": code, "Qty": qty, "ID": len(self.data["Products"]) + 1, "isNew": True, "AutoRemove": False}
+        self.data["Products"].append(product)
+        return product
+
+
+def locate_closest_store(address: str) -> Optional[ClientStore]:
+    """Nearest open delivery store to an address, or None"""
+    stores = call_sync(get_dominos_client().find_stores(address))
+    return ClientStore(stores[0]) if stores else None
+
+
+def _order_payload(order: Any) -> Dict[str, Any]:
+    """An order's data with its store and customer filled in, as pizzapi sends it"""
+    order.data["StoreID"] = order.store.id
+    customer = getattr(order, "customer", None)
+    if customer is not None:
+        order.data.update(
+            Email=customer.email,
+            FirstName=customer.first_name,
+            LastName=customer.last_name,
+            Phone=customer.phone,
+        )
+    if not order.data.get("Products"):
+        raise DominosError("Order has no products")
+    return order.data
+
+
+async def price_order(order: Any) -> Dict[str, Any]:
+    """Price an order and merge the priced fields (Amounts etc.) into its data"""
+    response = await call(get_dominos_client().price_order(_order_payload(order)))
+    if response.get("Status") == -1:
+        raise DominosError(f"Pricing failed: {response.get('Order', {}).get('StatusItems') or response}")
+    for key, value in response.get("Order", {}).items():
+        if value or not isinstance(value, list):
+            order.data[key] = value
+    return response
+
+
+async def place_order(order: Any, card: Any = None) -> Dict[str, Any]:
+    """Price, attach payment and place an order"""
+    await price_order(order)
+    if card is None:
+        order.data["Payments"] = [{"Type": "Cash"}]
+    else:
+        order.data["Payments"] = [{
+            "Type": "CreditCard",
+            "Expiration": card.expiration,
+            "Amount": order.data.get("Amounts", {}).get("Customer", 0),
+            "CardType": card.card_type,
+            "Number": int(card.number),
+            "SecurityCode": int(card.cvv),
+            "PostalCode": int(card.zip),
+        }]
+    return await call(get_dominos_client().place_order(_order_payload(order)))
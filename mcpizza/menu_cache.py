@@ -0,0 +1,400 @@
+"""
+MCPizza menu cache
+
+Keeps parsed store menus in memory so repeated menu tools don't re-download
+the full menu JSON from Domino's on every call.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .catalog import OptionCatalog
+from .coupons import CouponCatalog
+from .menu_index import SegmentedIndex, shared_segment, shared_segment_count
+from .menu_table import MenuTable, interned_product_count
+from .singleflight import SingleFlight
+from .snapshot import get_menu_snapshot
+
+logger = logging.getLogger("mcpizza")
+
+DEFAULT_TTL_SECONDS = 600.0
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_SNAPSHOT_MAX_AGE_SECONDS = 24 * 60 * 60.0
+
+# Approximate per-store cost of a product whose text and index are shared
+PRODUCT_OVERLAY_BYTES = 120
+
+
+def estimate_menu_size(menu: Any) -> int:
+    """Rough resident size of a menu, measured as its compact JSON length"""
+    size = getattr(menu, "size", None)
+    if size is not None:
+        return size
+    data = getattr(menu, "data", menu)
+    try:
+        return len(json.dumps(data, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def menu_fingerprints(menu_data: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """Content hash and compact JSON size of every top-level menu section"""
+    fingerprints: Dict[str, str] = {}
+    sizes: Dict[str, int] = {}
+    for key, value in menu_data.items():
+        encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+        fingerprints[key] = hashlib.sha1(encoded).hexdigest()
+        sizes[key] = len(encoded)
+    return fingerprints, sizes
+
+
+class StoreMenu:
+    """A store's parsed menu: product table, search index, option and coupon catalogs
+
+    The raw menu payload is not kept. Product text and category index
+    segments are shared with other stores that list the same products, so
+    a store's own footprint is mostly its prices (see size).
+    """
+
+    __slots__ = ("store_id", "table", "index", "catalog", "coupons", "fingerprints", "size")
+
+    def __init__(self, store_id: Any, menu: Any, previous: Optional["StoreMenu"] = None):
+        """Parse a menu, reusing the categories of a previous version that didn't change"""
+        self.store_id = str(store_id)
+        self.fingerprints, section_sizes = menu_fingerprints(menu.data)
+
+        categories = [
+            (name, items) for name, items in menu.data.items()
+            if isinstance(items, dict) and "Products" in items
+        ]
+        reusable = previous is not None and previous.reusable_for([name for name, _ in categories])
+
+        # Sections other than product categories feed the catalog
+        category_names = {name for name, _ in categories}
+        self.size = sum(size for name, size in section_sizes.items() if name not in category_names)
+        self.table = MenuTable()
+        segments = []
+        segment_products = []
+        for name, items in categories:
+            category_id = self.table.category_id(name)
+            if reusable and previous.fingerprints.get(name) == self.fingerprints[name]:
+                products = previous.table.category_products[category_id]
+                for product in products:
+                    self.table.add_product(product)
+                segment = previous.index.segments[category_id]
+                self.size += len(products) * PRODUCT_OVERLAY_BYTES
+            else:
+                products = [
+                    self.table.add(name, code, product_data)
+                    for code, product_data in items["Products"].items()
+                    if isinstance(product_data, dict)
+                ]
+                segment, built = shared_segment(products)
+                self.size += section_sizes[name] if built else len(products) * PRODUCT_OVERLAY_BYTES
+            segments.append(segment)
+            segment_products.append(products)
+        self.index = SegmentedIndex(segments, segment_products)
+        self.catalog = OptionCatalog.from_menu(menu.data, self.table)
+        self.coupons = CouponCatalog.from_menu(menu.data)
+
+    @classmethod
+    def from_parts(cls, store_id: Any, table: MenuTable, index: Any, catalog: OptionCatalog,
+                   size: int = 0) -> "StoreMenu":
+        """Assemble a StoreMenu from prebuilt structures, e.g. a snapshot"""
+        store_menu = cls.__new__(cls)
+        store_menu.store_id = str(store_id)
+        store_menu.table = table
+        store_menu.index = index
+        store_menu.catalog = catalog
+        store_menu.coupons = CouponCatalog()
+        store_menu.fingerprints = None
+        store_menu.size = size
+        return store_menu
+
+    def reusable_for(self, category_names: List[str]) -> bool:
+        """Whether a new menu with these categories can reuse this menu's per-category parts"""
+        return (
+            self.fingerprints is not None
+            and isinstance(self.index, SegmentedIndex)
+            and self.table.categories == category_names
+        )
+
+    def refreshed(self, menu: Any) -> Tuple["StoreMenu", int, int]:
+        """This store's menu updated to a newly fetched payload
+
+        Also returns how many product categories were rebuilt and how many
+        other sections (variants, coupons, toppings...) changed; the option
+        and coupon catalogs are rebuilt when any of those did.
+        """
+        store_menu = StoreMenu(self.store_id, menu, previous=self)
+        if store_menu.fingerprints == self.fingerprints:
+            return self, 0, 0
+        previous = self.fingerprints or {}
+        categories = set(store_menu.table.categories)
+        changed_sections = sum(
+            1 for name, fingerprint in store_menu.fingerprints.items()
+            if name not in categories and previous.get(name) != fingerprint
+        )
+        if not self.reusable_for(store_menu.table.categories):
+            return store_menu, len(categories), changed_sections
+        rebuilt = sum(1 for name in categories if previous.get(name) != store_menu.fingerprints[name])
+        return store_menu, rebuilt, changed_sections
+
+
+class _CacheEntry:
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value: Any, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class MenuCache:
+    """LRU cache of store menus keyed by StoreID, with per-entry TTL"""
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        sizer: Callable[[Any], int] = estimate_menu_size,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizer = sizer
+        self._clock = clock
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.refreshes = 0
+        self.unchanged_refreshes = 0
+        self.rebuilt_categories = 0
+        self.changed_sections = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, store_id: Any) -> bool:
+        return self.get(store_id, count=False) is not None
+
+    def get(self, store_id: Any, count: bool = True) -> Optional[Any]:
+        """Return the cached menu for a store, or None if missing or expired
+
+        Expired menus stay resident (subject to LRU eviction) so that a refresh
+        can diff against them; see peek().
+        """
+        key = str(store_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= self._clock():
+                if count:
+                    self.expirations += 1
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry.value
+
+    def put(self, store_id: Any, value: Any, ttl: Optional[float] = None) -> None:
+        """Insert or replace a store's menu, evicting LRU entries as needed"""
+        key = str(store_id)
+        size = self._sizer(value)
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CacheEntry(value, size, expires_at)
+            self.current_bytes += size
+            self._evict()
+
+    def peek(self, store_id: Any) -> Optional[Any]:
+        """Return a store's menu even if expired, without touching LRU order or counters"""
+        with self._lock:
+            entry = self._entries.get(str(store_id))
+            return None if entry is None else entry.value
+
+    def record_refresh(self, rebuilt_categories: int, changed_sections: int = 0) -> None:
+        """Count a refresh of an already cached menu"""
+        with self._lock:
+            self.refreshes += 1
+            self.rebuilt_categories += rebuilt_categories
+            self.changed_sections += changed_sections
+            if rebuilt_categories == 0 and changed_sections == 0:
+                self.unchanged_refreshes += 1
+
+    def get_or_load(self, store_id: Any, loader: Callable[[], Any]) -> Any:
+        """Return the cached menu, calling loader() and caching it on a miss"""
+        value = self.get(store_id)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.put(store_id, value)
+        return value
+
+    def invalidate(self, store_id: Any = None) -> None:
+        """Drop one store's menu, or every menu when store_id is None"""
+        with self._lock:
+            if store_id is None:
+                self._entries.clear()
+                self.current_bytes = 0
+            elif str(store_id) in self._entries:
+                self._remove(str(store_id))
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and occupancy for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "refreshes": self.refreshes,
+                "unchanged_refreshes": self.unchanged_refreshes,
+                "rebuilt_categories": self.rebuilt_categories,
+                "changed_sections": self.changed_sections,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds max_bytes
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes
+        ):
+            key, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry.size
+            self.evictions += 1
+            logger.debug(f"Evicted menu for store {key}")
+
+
+def menu_cache_from_env() -> MenuCache:
+    """Build a MenuCache configured from MCPIZZA_MENU_CACHE_* environment variables"""
+    return MenuCache(
+        ttl=float(os.getenv("MCPIZZA_MENU_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+        max_entries=int(os.getenv("MCPIZZA_MENU_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        max_bytes=int(os.getenv("MCPIZZA_MENU_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+    )
+
+
+# Shared cache used by every menu-consuming tool in this process
+menu_cache = menu_cache_from_env()
+
+
+def interning_stats() -> Dict[str, int]:
+    """How many product records and index segments are shared across cached stores"""
+    return {
+        "interned_products": interned_product_count(),
+        "shared_segments": shared_segment_count(),
+    }
+
+
+# Coalesces concurrent menu downloads for the same store
+menu_flight = SingleFlight()
+
+# Snapshot menus older than this are only served when Domino's can't be reached
+SNAPSHOT_MAX_AGE = float(os.getenv("MCPIZZA_MENU_SNAPSHOT_MAX_AGE", DEFAULT_SNAPSHOT_MAX_AGE_SECONDS))
+# Stores whose snapshot menu this process has already used as a warm start
+_warm_started: Set[str] = set()
+
+
+def find_store_menu(store_id: Any, allow_stale: bool = False) -> Optional[StoreMenu]:
+    """A store's menu from the cache or the on-disk snapshot, without any upstream call
+
+    A snapshot menu is a warm start: the first lookup of a store in this
+    process serves it for up to the cache TTL, as long as the snapshot is
+    younger than MCPIZZA_MENU_SNAPSHOT_MAX_AGE. After that the menu is
+    fetched from Domino's like any expired one. With allow_stale, an expired
+    cached or snapshot menu is returned instead of None, for callers that
+    can't fetch the menu themselves.
+    """
+    if not store_id:
+        return None
+    store_menu = menu_cache.get(store_id)
+    if store_menu is None and allow_stale:
+        store_menu = menu_cache.peek(store_id)
+    if store_menu is not None:
+        return store_menu
+
+    snapshot = get_menu_snapshot()
+    if snapshot is None or store_id not in snapshot:
+        return None
+    age = time.time() - snapshot.saved_at(store_id)
+    fresh = age < SNAPSHOT_MAX_AGE and str(store_id) not in _warm_started
+    if not fresh and not allow_stale:
+        return None
+    store_menu = StoreMenu.from_parts(store_id, *snapshot.load(store_id), size=snapshot.section_size(store_id))
+    _warm_started.add(str(store_id))
+    # A stale one is cached already expired: peek() still finds it, and
+    # refreshes replace it
+    menu_cache.put(store_id, store_menu, ttl=min(menu_cache.ttl, SNAPSHOT_MAX_AGE - age) if fresh else 0.0)
+    return store_menu
+
+
+def refresh_store_menu(store: Any) -> StoreMenu:
+    """Fetch a store's menu from Domino's and cache it, rebuilding only changed categories"""
+    store_id = store.data.get("StoreID")
+    menu = store.get_menu()
+    previous = menu_cache.peek(store_id)
+    if previous is None:
+        store_menu = StoreMenu(store_id, menu)
+    else:
+        store_menu, rebuilt, changed_sections = previous.refreshed(menu)
+        menu_cache.record_refresh(rebuilt, changed_sections)
+        logger.debug(f"Refreshed menu for store {store_id}: {rebuilt} categories rebuilt, {changed_sections} other sections changed")
+    menu_cache.put(store_id, store_menu)
+    return store_menu
+
+
+def _refresh_or_stale(store: Any) -> StoreMenu:
+    store_id = store.data.get("StoreID")
+    try:
+        return refresh_store_menu(store)
+    except Exception as e:
+        # An out-of-date menu beats none while Domino's is unreachable
+        store_menu = find_store_menu(store_id, allow_stale=True)
+        if store_menu is None:
+            raise
+        logger.warning(f"Menu refresh for store {store_id} failed, serving the expired menu: {e}")
+        return store_menu
+
+
+def load_store_menu(store: Any) -> StoreMenu:
+    """Get a pizzapi store's parsed menu from the cache, the snapshot or Domino's
+
+    Concurrent loads of the same uncached menu share one upstream request.
+    If the request fails, an expired cached or snapshot menu is returned
+    when there is one.
+    """
+    store_id = store.data.get("StoreID")
+    store_menu = find_store_menu(store_id)
+    if store_menu is None:
+        # Re-check inside the flight: a load may have finished since the miss
+        store_menu = menu_flight.do(str(store_id), lambda: find_store_menu(store_id) or _refresh_or_stale(store))
+    return store_menu
@@ -0,0 +1,202 @@
+"""
+MCPizza menu search index
+
+An inverted index over a store menu's product codes, names and descriptions.
+It is built once when a menu is loaded so that search_menu answers queries
+with posting-list intersections instead of scanning every product.
+"""
+
+import heapq
+import re
+import threading
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .menu_table import MenuTable, Product, ProductInfo
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Relevance weights per field and match kind
+CODE_WEIGHT = 8.0
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+PREFIX_FACTOR = 0.5
+
+MIN_PREFIX_LENGTH = 2
+
+# Anything with code, name and description: a store's Product or shared ProductInfo
+Indexable = Union[Product, ProductInfo]
+
+# Top-k cap applied by the menu search tools
+DEFAULT_SEARCH_LIMIT = 50
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercase alphanumeric tokens of a text value"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class MenuIndex:
+    """Token, prefix and code postings for one menu"""
+
+    def __init__(self):
+        self.products: List[Indexable] = []
+        self._codes: Dict[str, int] = {}
+        self._tokens: Dict[str, Dict[int, float]] = {}
+        self._prefixes: Dict[str, Dict[int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    @classmethod
+    def from_table(cls, table: MenuTable) -> "MenuIndex":
+        return cls.from_products(table)
+
+    @classmethod
+    def from_products(cls, products: Iterable[Indexable]) -> "MenuIndex":
+        index = cls()
+        for product in products:
+            index.add(product)
+        return index
+
+    def token_postings(self) -> Dict[str, Dict[int, float]]:
+        """Exact-token postings keyed by token, as doc id -> weight"""
+        return self._tokens
+
+    def add(self, product: Indexable) -> int:
+        """Index one product and return its document id"""
+        doc_id = len(self.products)
+        self.products.append(product)
+        self._codes[product.code.lower()] = doc_id
+
+        weights: Dict[str, float] = {}
+        for token in tokenize(product.code):
+            weights[token] = max(weights.get(token, 0.0), CODE_WEIGHT)
+        for token in tokenize(product.name):
+            weights[token] = max(weights.get(token, 0.0), NAME_WEIGHT)
+        for token in tokenize(product.description):
+            weights[token] = max(weights.get(token, 0.0), DESCRIPTION_WEIGHT)
+
+        for token, weight in weights.items():
+            self._tokens.setdefault(token, {})[doc_id] = weight
+            for end in range(MIN_PREFIX_LENGTH, len(token)):
+                posting = self._prefixes.setdefault(token[:end], {})
+                if posting.get(doc_id, 0.0) < weight:
+                    posting[doc_id] = weight
+        return doc_id
+
+    def lookup_code(self, code: str) -> Optional[Indexable]:
+        """Exact product code lookup"""
+        doc_id = self._codes.get(str(code).lower())
+        return None if doc_id is None else self.products[doc_id]
+
+    def _postings(self, token: str) -> Dict[int, float]:
+        """Documents matching a query token exactly or by prefix, with scores"""
+        scores = {doc_id: weight * PREFIX_FACTOR for doc_id, weight in self._prefixes.get(token, {}).items()}
+        for doc_id, weight in self._tokens.get(token, {}).items():
+            if scores.get(doc_id, 0.0) < weight:
+                scores[doc_id] = weight
+        return scores
+
+    def score(self, query: str) -> Dict[int, float]:
+        """Relevance of every document matching all query tokens"""
+        code_hit = self._codes.get(query.strip().lower())
+        tokens = tokenize(query)
+        if not tokens:
+            return {} if code_hit is None else {code_hit: CODE_WEIGHT}
+
+        # Intersect smallest posting lists first
+        postings = sorted((self._postings(token) for token in tokens), key=len)
+        scores = dict(postings[0])
+        for posting in postings[1:]:
+            scores = {doc_id: score + posting[doc_id] for doc_id, score in scores.items() if doc_id in posting}
+            if not scores:
+                break
+        if code_hit is not None:
+            scores[code_hit] = scores.get(code_hit, 0.0) + CODE_WEIGHT * len(tokens)
+        return scores
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Indexable]:
+        """Products matching every query token, best matches first"""
+        scores = self.score(query)
+        ranked = ((score, -doc_id) for doc_id, score in scores.items())
+        if limit is not None and limit < len(scores):
+            top = heapq.nlargest(limit, ranked)
+        else:
+            top = sorted(ranked, reverse=True)
+        return [self.products[-neg_doc_id] for _, neg_doc_id in top]
+
+
+_segment_pool: "weakref.WeakValueDictionary[Tuple[ProductInfo, ...], MenuIndex]" = weakref.WeakValueDictionary()
+_segment_pool_lock = threading.Lock()
+
+
+def shared_segment(products: Sequence[Product]) -> Tuple[MenuIndex, bool]:
+    """Index segment over the products' shared info, reused by every store listing the same products
+
+    Returns the segment and whether it was newly built.
+    """
+    key = tuple(product.info for product in products)
+    with _segment_pool_lock:
+        segment = _segment_pool.get(key)
+        if segment is not None:
+            return segment, False
+    segment = MenuIndex.from_products(key)
+    with _segment_pool_lock:
+        return _segment_pool.setdefault(key, segment), True
+
+
+def shared_segment_count() -> int:
+    return len(_segment_pool)
+
+
+class SegmentedIndex:
+    """A menu index made of one MenuIndex segment per category
+
+    Segments are immutable once built and index store-independent product
+    info, so stores selling the same products in a category share one
+    segment, and a refreshed menu reuses the segments of categories that
+    didn't change. segment_products maps each segment's documents back to
+    this store's products (with its own prices).
+    """
+
+    def __init__(self, segments: List[MenuIndex], segment_products: List[List[Product]]):
+        self.segments = segments
+        self.segment_products = segment_products
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments)
+
+    def lookup_code(self, code: str) -> Optional[Product]:
+        for segment, products in zip(self.segments, self.segment_products):
+            doc_id = segment._codes.get(str(code).lower())
+            if doc_id is not None:
+                return products[doc_id]
+        return None
+
+    def token_postings(self) -> Dict[str, Dict[int, float]]:
+        """Postings of all segments merged into one doc id space, in segment order"""
+        merged: Dict[str, Dict[int, float]] = {}
+        offset = 0
+        for segment in self.segments:
+            for token, posting in segment.token_postings().items():
+                target = merged.setdefault(token, {})
+                for doc_id, weight in posting.items():
+                    target[offset + doc_id] = weight
+            offset += len(segment)
+        return merged
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Product]:
+        """Products matching every query token across all segments, best matches first"""
+        ranked = [
+            (score, -segment_id, -doc_id)
+            for segment_id, segment in enumerate(self.segments)
+            for doc_id, score in segment.score(query).items()
+        ]
+        if limit is not None and limit < len(ranked):
+            top = heapq.nlargest(limit, ranked)
+        else:
+            top = sorted(ranked, reverse=True)
+        return [self.segment_products[-segment_id][-doc_id] for _, segment_id, doc_id in top]
@@ -0,0 +1,179 @@
+"""
+MCPizza menu product table
+
+A flattened, read-only view of a store menu's products. It is built once per
+menu load and shared by every tool, instead of each handler walking the
+nested menu.data[category]["Products"][code] dicts on every call.
+"""
+
+import sys
+import threading
+import weakref
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def iter_menu_products(menu_data: Dict[str, Any]) -> Iterable[Tuple[str, str, Dict[str, Any]]]:
+    """Yield (category, code, product) for every product in a menu's data"""
+    for category_name, items in menu_data.items():
+        if isinstance(items, dict) and "Products" in items:
+            for product_code, product_data in items["Products"].items():
+                if isinstance(product_data, dict):
+                    yield category_name, product_code, product_data
+
+
+def parse_price(value: Any) -> float:
+    """Convert a menu price ("$12.99", "12.99", 12.99, "") to a float"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace("$", "").replace(",", "").strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+class ProductInfo:
+    """Store-independent attributes of a product, interned and shared across stores"""
+
+    __slots__ = ("code", "name", "description", "__weakref__")
+
+    def __init__(self, code: str, name: str, description: str):
+        self.code = code
+        self.name = name
+        self.description = description
+
+
+_product_pool: "weakref.WeakValueDictionary[Tuple[str, str, str], ProductInfo]" = weakref.WeakValueDictionary()
+_product_pool_lock = threading.Lock()
+
+
+def intern_product(code: str, name: str, description: str) -> ProductInfo:
+    """The shared ProductInfo for these attributes, created on first use
+
+    Entries disappear once no cached menu references them.
+    """
+    key = (code, name, description)
+    with _product_pool_lock:
+        info = _product_pool.get(key)
+        if info is None:
+            info = ProductInfo(sys.intern(code), name, description)
+            _product_pool[key] = info
+        return info
+
+
+def interned_product_count() -> int:
+    return len(_product_pool)
+
+
+class Product:
+    """One product on one store's menu: shared info plus this store's price and category"""
+
+    __slots__ = ("info", "price", "category_id")
+
+    def __init__(self, info: ProductInfo, price: float, category_id: int):
+        self.info = info
+        self.price = price
+        self.category_id = category_id
+
+    @classmethod
+    def create(cls, code: str, name: str, description: str, price: float, category_id: int) -> "Product":
+        return cls(intern_product(code, name, description), price, category_id)
+
+    @property
+    def code(self) -> str:
+        return self.info.code
+
+    @property
+    def name(self) -> str:
+        return self.info.name
+
+    @property
+    def description(self) -> str:
+        return self.info.description
+
+    def __repr__(self) -> str:
+        return f"Product({self.code!r}, {self.name!r}, {self.price!r})"
+
+
+class MenuTable:
+    """Products of one menu, addressable by code and grouped by category"""
+
+    def __init__(self):
+        self.categories: List[str] = []
+        self.products: List[Product] = []
+        self.category_products: List[List[Product]] = []
+        self.by_code: Dict[str, Product] = {}
+        self._category_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def __iter__(self) -> Iterator[Product]:
+        return iter(self.products)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.by_code
+
+    @classmethod
+    def from_menu_data(cls, menu_data: Dict[str, Any]) -> "MenuTable":
+        table = cls()
+        for category_name, items in menu_data.items():
+            if isinstance(items, dict) and "Products" in items:
+                table.category_id(category_name)
+        for category_name, product_code, product_data in iter_menu_products(menu_data):
+            table.add(category_name, product_code, product_data)
+        return table
+
+    def category_id(self, category_name: str) -> int:
+        """Id of a category, registering it on first use"""
+        category_id = self._category_ids.get(category_name)
+        if category_id is None:
+            category_id = len(self.categories)
+            self._category_ids[category_name] = category_id
+            self.categories.append(sys.intern(category_name))
+            self.category_products.append([])
+        return category_id
+
+    def add(self, category_name: str, code: str, product_data: Dict[str, Any]) -> Product:
+        product = Product.create(
+            code=code,
+            name=product_data.get("Name", ""),
+            description=product_data.get("Description", ""),
+            price=parse_price(product_data.get("Price", "")),
+            category_id=self.category_id(category_name),
+        )
+        return self.add_product(product)
+
+    def add_product(self, product: Product) -> Product:
+        """Add an already built product; its category must be registered"""
+        self.products.append(product)
+        self.category_products[product.category_id].append(product)
+        self.by_code[product.code] = product
+        return product
+
+    def get(self, code: str) -> Optional[Product]:
+        return self.by_code.get(code)
+
+    def products_in(self, category_name: str) -> Optional[List[Product]]:
+        """Products of one category, or None if the menu has no such category"""
+        category_id = self._category_ids.get(category_name)
+        return None if category_id is None else self.category_products[category_id]
+
+    def category_of(self, product: Product) -> str:
+        return self.categories[product.category_id]
+
+    def price_of(self, code: str) -> Optional[float]:
+        """Menu price of a product code, or None if the menu doesn't list it"""
+        product = self.by_code.get(code)
+        return None if product is None else product.price
+
+    def to_dict(self, product: Product, include_category: bool = True) -> Dict[str, Any]:
+        """Tool-facing representation of a product"""
+        item = {
+            "code": product.code,
+            "name": product.name,
+            "description": product.description,
+            "price": product.price,
+        }
+        if include_category:
+            item = {"category": self.categories[product.category_id], **item}
+        return item
@@ -0,0 +1,124 @@
+"""
+MCPizza result paging
+
+Shared limit/cursor paging, field projection and compact JSON output for
+tools that can return large result sets (search_menu, get_store_menu).
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+PRODUCT_FIELDS = ["category", "code", "name", "description", "price"]
+
+# JSON schema fragments for tool inputSchema properties
+PAGING_PROPERTIES = {
+    "limit": {
+        "type": "integer",
+        "description": f"Maximum results per page (1-{MAX_PAGE_SIZE})",
+        "default": DEFAULT_PAGE_SIZE
+    },
+    "cursor": {
+        "type": "string",
+        "description": "next_cursor value from a previous page"
+    },
+    "fields": {
+        "type": "array",
+        "items": {"type": "string", "enum": PRODUCT_FIELDS},
+        "description": "Only return these fields for each item (e.g. ['code', 'name', 'price'])"
+    },
+    "compact": {
+        "type": "boolean",
+        "description": "Return compact JSON without indentation",
+        "default": False
+    }
+}
+
+
+class PageRequest:
+    """Paging, projection and output options parsed from tool arguments"""
+
+    __slots__ = ("limit", "offset", "fields", "compact")
+
+    def __init__(self, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0,
+                 fields: Optional[List[str]] = None, compact: bool = False):
+        self.limit = limit
+        self.offset = offset
+        self.fields = fields
+        self.compact = compact
+
+    @classmethod
+    def from_arguments(cls, arguments: Dict[str, Any]) -> "PageRequest":
+        """Parse limit/cursor/fields/compact, raising ValueError on bad input"""
+        limit = arguments.get("limit")
+        if limit is None:
+            limit = DEFAULT_PAGE_SIZE
+        elif isinstance(limit, bool) or not isinstance(limit, (int, float, str)) or (isinstance(limit, float) and not limit.is_integer()):
+            raise ValueError(f"limit must be a whole number from 1 to {MAX_PAGE_SIZE}")
+        else:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ValueError(f"limit must be a whole number from 1 to {MAX_PAGE_SIZE}")
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+
+        cursor = arguments.get("cursor")
+        try:
+            offset = int(cursor) if cursor else 0
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        if offset < 0:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+        fields = arguments.get("fields") or None
+        if isinstance(fields, str):
+            # One field, or a comma-separated list of them
+            fields = [field.strip() for field in fields.split(",") if field.strip()]
+        if fields is not None:
+            if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+                raise ValueError(f"fields must be a list of field names: {', '.join(PRODUCT_FIELDS)}")
+            unknown = [field for field in fields if field not in PRODUCT_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+        return cls(
+            limit=min(limit, MAX_PAGE_SIZE),
+            offset=offset,
+            fields=fields,
+            compact=bool(arguments.get("compact", False)),
+        )
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.limit
+
+    def slice(self, items: Sequence[Any]) -> Tuple[List[Any], Optional[str]]:
+        """This page of items and the cursor for the next page, if any"""
+        page = list(items[self.offset:self.end])
+        next_cursor = str(self.end) if len(items) > self.end else None
+        return page, next_cursor
+
+    def project(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        if self.fields is None:
+            return item
+        return {field: item[field] for field in self.fields if field in item}
+
+    def dumps(self, value: Any) -> str:
+        if self.compact:
+            return json.dumps(value, separators=(",", ":"))
+        return json.dumps(value, indent=2)
+
+    def render(self, items: Sequence[Dict[str, Any]]) -> Tuple[str, Optional[str]]:
+        """Slice, project and serialize a full result list"""
+        page, next_cursor = self.slice(items)
+        return self.dumps([self.project(item) for item in page]), next_cursor
+
+
+def next_page_hint(next_cursor: Optional[str]) -> str:
+    """Trailer telling the client how to fetch the next page"""
+    if next_cursor is None:
+        return ""
+    return f"\n\nMore results available. Call again with cursor=\"{next_cursor}\"."
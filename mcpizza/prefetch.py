@@ -0,0 +1,57 @@
+"""
+MCPizza menu prefetch
+
+Starts downloading and indexing a store's menu in the background as soon as
+the store is resolved, so the menu tools that usually follow find it ready
+(or already in flight) instead of issuing their own upstream request.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from .menu_cache import StoreMenu, find_store_menu, load_store_menu
+from .upstream import run_blocking
+
+logger = logging.getLogger("mcpizza")
+
+_inflight: Dict[str, "asyncio.Task[StoreMenu]"] = {}
+
+
+def _on_done(store_id: str, task: "asyncio.Task[StoreMenu]") -> None:
+    if _inflight.get(store_id) is task:
+        del _inflight[store_id]
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Menu prefetch for store {store_id} failed: {task.exception()}")
+
+
+def _start(store_id: str, store: Any) -> "asyncio.Task[StoreMenu]":
+    task = asyncio.get_running_loop().create_task(run_blocking(load_store_menu, store, name=f"Menu download for store {store_id}"))
+    _inflight[store_id] = task
+    task.add_done_callback(lambda t: _on_done(store_id, t))
+    return task
+
+
+def prefetch_store_menu(store: Any) -> Optional["asyncio.Task[StoreMenu]"]:
+    """Start loading a store's menu in the background; must be called from the event loop
+
+    Returns the in-flight task, or None when the menu is already cached.
+    """
+    store_id = str(store.data.get("StoreID"))
+    task = _inflight.get(store_id)
+    if task is None and find_store_menu(store_id) is None:
+        task = _start(store_id, store)
+    return task
+
+
+async def await_store_menu(store: Any) -> StoreMenu:
+    """A store's menu, joining an in-flight prefetch instead of fetching it twice"""
+    store_id = str(store.data.get("StoreID"))
+    task = _inflight.get(store_id)
+    if task is None:
+        store_menu = find_store_menu(store_id)
+        if store_menu is not None:
+            return store_menu
+        task = _start(store_id, store)
+    # Shield so a cancelled tool call doesn't cancel the shared download
+    return await asyncio.shield(task)
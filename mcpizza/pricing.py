@@ -0,0 +1,109 @@
+"""
+MCPizza local order pricing
+
+Estimates an order's subtotal from the cached store menu's prices, so the
+cart can be priced after every change without a Domino's round trip. Only
+list prices are known locally: taxes, delivery fees and coupon discounts
+come from Domino's, which prices the order authoritatively once, when it is
+placed (or when an exact total is asked for).
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from .menu_table import parse_price
+
+
+def unit_price(menu: Any, code: str) -> Optional[float]:
+    """Menu price of an orderable code (a variant or a product), or None if the menu has none"""
+    variant = menu.catalog.variants.get(code)
+    if variant is not None and variant.price:
+        return variant.price
+    price = menu.table.price_of(code)
+    return price or None
+
+
+class LineEstimate:
+    """Estimated price of one cart line"""
+
+    __slots__ = ("code", "quantity", "unit_price")
+
+    def __init__(self, code: str, quantity: int, unit_price: Optional[float]):
+        self.code = code
+        self.quantity = quantity
+        self.unit_price = unit_price
+
+    @property
+    def total(self) -> Optional[float]:
+        return None if self.unit_price is None else round(self.unit_price * self.quantity, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"code": self.code, "quantity": self.quantity, "unit_price": self.unit_price, "total": self.total}
+
+
+class OrderEstimate:
+    """Locally estimated subtotal of a cart"""
+
+    def __init__(self, lines: List[LineEstimate], min_delivery_amount: Optional[float] = None):
+        self.lines = lines
+        self.min_delivery_amount = min_delivery_amount
+
+    @property
+    def quantity(self) -> int:
+        return sum(line.quantity for line in self.lines)
+
+    @property
+    def subtotal(self) -> float:
+        return round(sum(line.total or 0.0 for line in self.lines), 2)
+
+    @property
+    def unpriced(self) -> List[str]:
+        """Codes the menu has no price for; the subtotal leaves them out"""
+        return [line.code for line in self.lines if line.unit_price is None]
+
+    @property
+    def complete(self) -> bool:
+        return not self.unpriced
+
+    @property
+    def short_of_min_delivery(self) -> float:
+        """How much more the cart needs to reach the store's delivery minimum (0 when it does)"""
+        if not self.min_delivery_amount:
+            return 0.0
+        return round(max(0.0, self.min_delivery_amount - self.subtotal), 2)
+
+    def summary(self) -> str:
+        """One-line description, e.g. "Estimated subtotal: $25.98 for 2 items" """
+        text = f"Estimated subtotal: ${self.subtotal:.2f} for {self.quantity} item{'' if self.quantity == 1 else 's'}"
+        if self.unpriced:
+            text += f" (no menu price for {', '.join(sorted(set(self.unpriced)))})"
+        short = self.short_of_min_delivery
+        if short and self.complete:
+            text += f"; ${short:.2f} short of the ${self.min_delivery_amount:.2f} delivery minimum"
+        return text
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lines": [line.to_dict() for line in self.lines],
+            "quantity": self.quantity,
+            "subtotal": self.subtotal,
+            "unpriced": self.unpriced,
+            "min_delivery_amount": self.min_delivery_amount,
+            "short_of_min_delivery": self.short_of_min_delivery,
+            "estimated": True,
+        }
+
+
+def min_delivery_amount(store: Any) -> Optional[float]:
+    """A store's minimum delivery order amount, if its data lists one"""
+    data = getattr(store, "data", None) or {}
+    value = data.get("MinDeliveryOrderAmount")
+    return None if value in (None, "") else parse_price(value)
+
+
+def estimate_order(items: Iterable[Dict[str, Any]], menu: Any, store: Any = None) -> OrderEstimate:
+    """Estimate a cart ({"code", "quantity"} lines) from a StoreMenu's prices"""
+    lines = [
+        LineEstimate(item["code"], int(item.get("quantity", 1)), unit_price(menu, item["code"]))
+        for item in items
+    ]
+    return OrderEstimate(lines, min_delivery_amount(store) if store is not None else None)
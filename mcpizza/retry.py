@@ -0,0 +1,123 @@
+"""
+MCPizza retries and hedged requests
+
+Helpers for idempotent upstream reads (store locator, profile, menu,
+pricing). retry() repeats a failed call with exponential backoff and full
+jitter, so clients failing together don't retry together. hedge() starts a
+duplicate call when the first hasn't answered within the endpoint's
+observed p95 latency and takes whichever answers first, cutting the tail
+that a single slow connection would otherwise add.
+
+Order placement is never retried or hedged: a duplicate could place the
+order twice.
+"""
+
+import asyncio
+import math
+import os
+import random
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+DEFAULT_ATTEMPTS = 3
+DEFAULT_BASE_DELAY_SECONDS = 0.2
+DEFAULT_MAX_DELAY_SECONDS = 2.0
+DEFAULT_HEDGE_PERCENTILE = 0.95
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_LATENCY_WINDOW = 200
+
+
+class RetryPolicy:
+    """How many times to try a call and how long to back off between tries"""
+
+    def __init__(
+        self,
+        attempts: int = DEFAULT_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY_SECONDS,
+        max_delay: float = DEFAULT_MAX_DELAY_SECONDS,
+    ):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, retry: int) -> float:
+        """Full-jitter delay before the given retry (0 for the first)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+async def retry(
+    call: Callable[[], Awaitable[Any]],
+    policy: RetryPolicy,
+    should_retry: Callable[[BaseException], bool],
+    deadline: Optional[float] = None,
+) -> Any:
+    """Await call(), retrying errors should_retry accepts up to policy.attempts times in all
+
+    With a deadline (event loop time), no retry is started that couldn't
+    begin before it; the last error is raised instead.
+    """
+    loop = asyncio.get_running_loop()
+    for n in range(policy.attempts):
+        try:
+            return await call()
+        except Exception as e:
+            if n + 1 >= policy.attempts or not should_retry(e):
+                raise
+            delay = policy.backoff(n)
+            if deadline is not None and loop.time() + delay >= deadline:
+                raise
+        await asyncio.sleep(delay)
+
+
+class LatencyTracker:
+    """Recent successful call durations of one endpoint"""
+
+    def __init__(self, window: int = DEFAULT_LATENCY_WINDOW, min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th quantile of recent durations, or None until enough calls have been seen"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(p * len(ordered)) - 1)]
+
+
+async def hedge(call: Callable[[], Awaitable[Any]], delay: Optional[float]) -> Any:
+    """Await call(); if it hasn't finished after delay seconds, race a second call() against it
+
+    The first successful result wins and the other call is cancelled. A
+    delay of None disables hedging.
+    """
+    if delay is None:
+        return await call()
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def retry_policy_from_env() -> RetryPolicy:
+    """Build a RetryPolicy configured from MCPIZZA_RETRY_* environment variables"""
+    return RetryPolicy(
+        attempts=int(os.getenv("MCPIZZA_RETRY_ATTEMPTS", DEFAULT_ATTEMPTS)),
+        base_delay=float(os.getenv("MCPIZZA_RETRY_BASE_DELAY", DEFAULT_BASE_DELAY_SECONDS)),
+        max_delay=float(os.getenv("MCPIZZA_RETRY_MAX_DELAY", DEFAULT_MAX_DELAY_SECONDS)),
+    )
@@ -6,8 +6,12 @@ This server provides tools for ordering pizza through the unofficial Domino's AP
 """
 
 import asyncio
+import copy
+import hashlib
 import json
 import logging
+import uuid
+import weakref
 from typing import Any, Dict, List, Optional
 
 from mcp.server import Server
@@ -30,19 +34,172 @@ except ImportError:
     print("pizzapi not installed. Install with: pip install pizzapi")
     exit(1)
 
+from mcpizza.cart import MAX_ORDER_LINES, CartVersions, compact_line, line_key, parse_lines, parse_version, validate_lines
+from mcpizza.coupons import normalize_code
+from mcpizza.dominos import ClientOrder, ClientStore, locate_closest_store, place_order, price_order
+from mcpizza.prefetch import await_store_menu, prefetch_store_menu
+from mcpizza.pricing import OrderEstimate, estimate_order
+from mcpizza.sessions import DEFAULT_SESSION, session_store_from_env
+from mcpizza.paging import PAGING_PROPERTIES, PageRequest, next_page_hint
+from mcpizza.store_cache import MAX_BATCH_ADDRESSES, find_closest_store, resolve_addresses
+from mcpizza.store_registry import registry_locator
+from mcpizza.upstream import BATCH_TIMEOUT, UpstreamTimeout, run_blocking
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("mcpizza")
 
 class PizzaOrder:
-    """Manages a pizza order state"""
+    """Manages a pizza order state
+
+    Changes to the cart go through the methods below, which mark it dirty so
+    its content hash is recomputed. Prices are remembered against that hash:
+    an unchanged cart is never priced twice.
+    """
     def __init__(self):
         self.store = None
         self.customer = None
+        self.customer_data = None
         self.order = None
         self.items = []
+        self.coupons = []
+        self.versions = CartVersions()
+        self._hash = None
+        self._priced_hash = None
+        self._estimate = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The estimate memo references the whole store menu; don't spill it
+        state = self.__dict__.copy()
+        state["_estimate"] = None
+        return state
+
+    def touch(self, *keys: str) -> None:
+        """Mark the cart as changed, starting a new version that changed keys"""
+        self._hash = None
+        self._priced_hash = None
+        self.versions.bump(*keys)
+
+    def set_store(self, store: Any) -> None:
+        self.store = store
+        self.touch("store")
+
+    def set_customer(self, customer: Any, customer_data: Dict[str, Any]) -> None:
+        self.customer = customer
+        self.customer_data = customer_data
+        self.touch("customer")
+
+    def add_item(self, item_code: str, quantity: int, options: Dict[str, Any]) -> None:
+        """Add an item, merged into the cart's line for the same item and options"""
+        key = line_key(item_code, options)
+        number = next((i for i, line in enumerate(self.items) if line_key(line["code"], line["options"]) == key), None)
+        if number is None:
+            # One product carrying the quantity
+            product = self.order.add_item(item_code, quantity)
+            if options:
+                product["Options"] = options
+            self.items.append({
+                "code": item_code,
+                "quantity": quantity,
+                "options": options
+            })
+        else:
+            line = self.items[number]
+            line["quantity"] += quantity
+            self._product(number)["Qty"] = line["quantity"]
+        self.touch(key)
+
+    def add_lines(self, lines: List[Dict[str, Any]]) -> None:
+        """Add parsed cart lines, all or none: the cart is restored if one fails"""
+        saved = copy.deepcopy((self.items, self.order.data["Products"], self.versions, self._priced_hash))
+        try:
+            for line in lines:
+                self.add_item(line["code"], line["quantity"], line["options"])
+        except Exception:
+            self.items, self.order.data["Products"], self.versions, self._priced_hash = saved
+            self._hash = None
+            raise
+
+    def _product(self, number: int) -> Dict[str, Any]:
+        """The order's product for cart line number
+
+        Looked up each time: pricing replaces order.data["Products"] with
+        Domino's copies, in the same order as the cart's lines.
+        """
+        line = self.items[number]
+        products = self.order.data["Products"]
+        if number < len(products) and products[number].get("Code") == line["code"]:
+            return products[number]
+        for product in products:
+            if product.get("Code") == line["code"] and (product.get("Options") or {}) == line["options"]:
+                return product
+        raise ValueError(f"Order has no product for cart line {line['code']}")
+
+    def add_coupon(self, coupon_code: str) -> None:
+        # pizzapi's add_coupon looks coupons up among the menu's variants,
+        # where they never are; add the entry Domino's expects directly
+        coupons = self.order.data.setdefault("Coupons", [])
+        coupons.append({"Code": coupon_code, "Qty": 1, "ID": len(coupons) + 1, "IsNew": True})
+        self.coupons.append(coupon_code)
+        self.touch("coupons")
+
+    def content_hash(self) -> str:
+        """Hash of everything that affects the price: store, items, options, coupons and customer address"""
+        if self._hash is None:
+            content = {
+                "store": self.store.data.get("StoreID") if self.store else None,
+                "items": self.items,
+                "coupons": self.coupons,
+                "address": (self.customer_data or {}).get("Address"),
+            }
+            encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+            self._hash = hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+        return self._hash
+
+    @property
+    def priced(self) -> bool:
+        """Whether order.data holds Domino's prices for the cart as it is now"""
+        return self._priced_hash is not None and self._priced_hash == self.content_hash()
+
+    def mark_priced(self) -> None:
+        self._priced_hash = self.content_hash()
+
+    def cached_estimate(self, menu: Any) -> Optional[OrderEstimate]:
+        if self._estimate is not None:
+            content_hash, estimated_menu, estimate = self._estimate
+            if content_hash == self.content_hash() and estimated_menu is menu:
+                return estimate
+        return None
+
+    def remember_estimate(self, menu: Any, estimate: OrderEstimate) -> None:
+        self._estimate = (self.content_hash(), menu, estimate)
+
+# Order state per MCP client session
+order_sessions = session_store_from_env(PizzaOrder)
+_session_keys: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+
+def session_key(server: Server) -> str:
+    """Order session key of the MCP session making the current request"""
+    try:
+        session = server.request_context.session
+    except LookupError:
+        return DEFAULT_SESSION
+    key = _session_keys.get(session)
+    if key is None:
+        key = _session_keys[session] = uuid.uuid4().hex
+    return key
+
+async def estimate_cart(pizza_order: PizzaOrder) -> OrderEstimate:
+    """Subtotal of the cart estimated from the store's cached menu prices"""
+    menu = await await_store_menu(pizza_order.store)
+    estimate = pizza_order.cached_estimate(menu)
+    if estimate is None:
+        estimate = estimate_order(pizza_order.items, menu, pizza_order.store)
+        pizza_order.remember_estimate(menu, estimate)
+    return estimate
 
-pizza_order = PizzaOrder()
+# Registry first, the live store locator for addresses it has no nearby store for
+locate_store = registry_locator(locate_closest_store, ClientStore)
 
 # Available tools
 TOOLS = [
@@ -60,16 +217,37 @@ TOOLS = [
             "required": ["address"]
         }
     ),
+    Tool(
+        name="find_dominos_stores",
+        description="Find the nearest Domino's store for each of many addresses at once",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "addresses": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "maxItems": MAX_BATCH_ADDRESSES,
+                    "description": "Addresses or zip codes; results come back in the same order"
+                }
+            },
+            "required": ["addresses"]
+        }
+    ),
     Tool(
         name="get_store_menu",
-        description="Get the full menu from a Domino's store",
+        description="Get the menu categories from a Domino's store, or the products in one category",
         inputSchema={
             "type": "object",
             "properties": {
                 "store_id": {
                     "type": "string",
                     "description": "Store ID from find_dominos_store result"
-                }
+                },
+                "category": {
+                    "type": "string",
+                    "description": "List the products in this category (paged)"
+                },
+                **PAGING_PROPERTIES
             },
             "required": ["store_id"]
         }
@@ -87,7 +265,8 @@ TOOLS = [
                 "store_id": {
                     "type": "string",
                     "description": "Store ID from find_dominos_store result"
-                }
+                },
+                **PAGING_PROPERTIES
             },
             "required": ["query", "store_id"]
         }
@@ -100,7 +279,7 @@ TOOLS = [
             "properties": {
                 "item_code": {
                     "type": "string",
-                    "description": "Product code from menu search"
+                    "description": "Variant code (one size and crust) of a menu item, e.g. 14SCREEN"
                 },
                 "quantity": {
                     "type": "integer",
@@ -116,12 +295,47 @@ TOOLS = [
             "required": ["item_code"]
         }
     ),
+    Tool(
+        name="add_items_to_order",
+        description="Add many items to the pizza order at once; lines for the same item and options are merged",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "maxItems": MAX_ORDER_LINES,
+                    "description": "Order lines, all checked before any is added",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "item_code": {"type": "string", "description": "Variant code (one size and crust) of a menu item, e.g. 14SCREEN"},
+                            "quantity": {"type": "integer", "description": "Number of items to add", "default": 1},
+                            "options": {"type": "object", "description": "Item customization options", "default": {}}
+                        },
+                        "required": ["item_code"]
+                    }
+                }
+            },
+            "required": ["items"]
+        }
+    ),
     Tool(
         name="view_order",
-        description="View current order contents and total",
+        description="View current order contents and estimated total. Pass since_version to get only the lines changed since a version seen earlier",
         inputSchema={
             "type": "object",
-            "properties": {},
+            "properties": {
+                "since_version": {
+                    "type": "integer",
+                    "description": "Cart version from an earlier view_order; only changes after it are returned"
+                },
+                "detail": {
+                    "type": "string",
+                    "enum": ["summary", "full"],
+                    "description": "summary (compact lines and totals) or full (also the raw Domino's order data)",
+                    "default": "summary"
+                }
+            },
             "required": []
         }
     ),
@@ -151,16 +365,18 @@ TOOLS = [
     ),
     Tool(
         name="calculate_order_total",
-        description="Calculate order total with tax and delivery fees",
+        description="Calculate order total. Estimated from menu prices unless exact is set, which prices it with Domino's including tax and delivery fees",
         inputSchema={
             "type": "object",
-            "properties": {},
+            "properties": {
+                "exact": {"type": "boolean", "description": "Get Domino's exact total instead of the local estimate", "default": False}
+            },
             "required": []
         }
     ),
     Tool(
         name="apply_coupon",
-        description="Apply a coupon code to the order",
+        description="Apply a coupon code to the order after checking it applies to the cart, with estimated savings",
         inputSchema={
             "type": "object",
             "properties": {
@@ -196,13 +412,26 @@ TOOLS = [
     )
 ]
 
+def summarize_store(store) -> Dict[str, Any]:
+    """Tool-facing summary of a located store"""
+    return {
+        "store_id": store.data.get("StoreID"),
+        "phone": store.data.get("Phone"),
+        "address": f"{store.data.get('StreetName', '')} {store.data.get('City', '')}",
+        "is_delivery_store": store.data.get("IsDeliveryStore"),
+        "min_delivery_order_amount": store.data.get("MinDeliveryOrderAmount"),
+        "delivery_minutes": store.data.get("ServiceEstimatedWaitMinutes", {}).get("Delivery"),
+        "pickup_minutes": store.data.get("ServiceEstimatedWaitMinutes", {}).get("Carryout")
+    }
+
 async def handle_find_dominos_store(arguments: Dict[str, Any]) -> CallToolResult:
     """Find nearest Domino's store"""
+    pizza_order = order_sessions.current()
     try:
         address = arguments["address"]
         
-        # Find nearest store
-        my_local_dominos = StoreLocator.find_closest_store_to_customer(address)
+        # Find nearest store (cached by normalized address)
+        my_local_dominos = await run_blocking(find_closest_store, address, locate_store, name="Store lookup")
         
         if not my_local_dominos:
             return CallToolResult(
@@ -213,17 +442,12 @@ async def handle_find_dominos_store(arguments: Dict[str, Any]) -> CallToolResult
             )
         
         # Store the found store globally for use in other tools
-        pizza_order.store = my_local_dominos
-        
-        store_info = {
-            "store_id": my_local_dominos.data.get("StoreID"),
-            "phone": my_local_dominos.data.get("Phone"),
-            "address": f"{my_local_dominos.data.get('StreetName', '')} {my_local_dominos.data.get('City', '')}",
-            "is_delivery_store": my_local_dominos.data.get("IsDeliveryStore"),
-            "min_delivery_order_amount": my_local_dominos.data.get("MinDeliveryOrderAmount"),
-            "delivery_minutes": my_local_dominos.data.get("ServiceEstimatedWaitMinutes", {}).get("Delivery"),
-            "pickup_minutes": my_local_dominos.data.get("ServiceEstimatedWaitMinutes", {}).get("Carryout")
-        }
+        pizza_order.set_store(my_local_dominos)
+        
+        # Menu tools usually follow, so start fetching the menu now
+        prefetch_store_menu(my_local_dominos)
+        
+        store_info = summarize_store(my_local_dominos)
         
         return CallToolResult(
             content=[TextContent(
@@ -240,8 +464,37 @@ async def handle_find_dominos_store(arguments: Dict[str, Any]) -> CallToolResult
             )]
         )
 
+async def handle_find_dominos_stores(arguments: Dict[str, Any]) -> CallToolResult:
+    """Find the nearest Domino's store for each of many addresses"""
+    try:
+        addresses = arguments["addresses"]
+        
+        def resolve(address: str):
+            store = find_closest_store(address, locate_store)
+            return summarize_store(store) if store else None
+        
+        # The current order's store is left alone
+        results = await run_blocking(resolve_addresses, addresses, resolve, timeout=BATCH_TIMEOUT, name="Batch store lookup")
+        found = sum(1 for result in results if "store" in result)
+        
+        return CallToolResult(
+            content=[TextContent(
+                type="text",
+                text=f"Found stores for {found} of {len(results)} addresses:\n{json.dumps(results, indent=2)}"
+            )]
+        )
+        
+    except Exception as e:
+        return CallToolResult(
+            content=[TextContent(
+                type="text",
+                text=f"Error finding stores: {str(e)}"
+            )]
+        )
+
 async def handle_get_store_menu(arguments: Dict[str, Any]) -> CallToolResult:
     """Get store menu"""
+    pizza_order = order_sessions.current()
     try:
         if not pizza_order.store:
             return CallToolResult(
@@ -251,27 +504,34 @@ async def handle_get_store_menu(arguments: Dict[str, Any]) -> CallToolResult:
                 )]
             )
         
-        menu = pizza_order.store.get_menu()
-        
-        # Extract useful menu categories
-        categories = {}
-        for category_name, items in menu.data.items():
-            if isinstance(items, dict) and "Products" in items:
-                products = []
-                for product_code, product_data in items["Products"].items():
-                    if isinstance(product_data, dict):
-                        products.append({
-                            "code": product_code,
-                            "name": product_data.get("Name", ""),
-                            "description": product_data.get("Description", ""),
-                            "price": product_data.get("Price", "")
-                        })
-                categories[category_name] = products
+        page = PageRequest.from_arguments(arguments)
+        menu = await await_store_menu(pizza_order.store)
+        category = arguments.get("category")
+        
+        if not category:
+            return CallToolResult(
+                content=[TextContent(
+                    type="text",
+                    text=f"Store menu categories:\n{page.dumps(menu.table.categories)}\n\nUse search_menu to find specific items, or pass a category to list its products."
+                )]
+            )
+        
+        products = menu.table.products_in(category)
+        if products is None:
+            return CallToolResult(
+                content=[TextContent(
+                    type="text",
+                    text=f"Unknown menu category '{category}'. Available categories: {', '.join(menu.table.categories)}"
+                )]
+            )
+        
+        items, next_cursor = page.slice(products)
+        listing = page.dumps([page.project(menu.table.to_dict(product)) for product in items])
         
         return CallToolResult(
             content=[TextContent(
                 type="text",
-                text=f"Store menu categories:\n{json.dumps(list(categories.keys()), indent=2)}\n\nUse search_menu to find specific items."
+                text=f"{category} ({len(products)} items):\n{listing}{next_page_hint(next_cursor)}"
             )]
         )
         
@@ -285,6 +545,7 @@ async def handle_get_store_menu(arguments: Dict[str, Any]) -> CallToolResult:
 
 async def handle_search_menu(arguments: Dict[str, Any]) -> CallToolResult:
     """Search menu for items"""
+    pizza_order = order_sessions.current()
     try:
         if not pizza_order.store:
             return CallToolResult(
@@ -295,26 +556,12 @@ async def handle_search_menu(arguments: Dict[str, Any]) -> CallToolResult:
             )
         
         query = arguments["query"].lower()
-        menu = pizza_order.store.get_menu()
-        
-        matching_items = []
-        
-        # Search through menu categories
-        for category_name, items in menu.data.items():
-            if isinstance(items, dict) and "Products" in items:
-                for product_code, product_data in items["Products"].items():
-                    if isinstance(product_data, dict):
-                        name = product_data.get("Name", "").lower()
-                        description = product_data.get("Description", "").lower()
-                        
-                        if query in name or query in description:
-                            matching_items.append({
-                                "category": category_name,
-                                "code": product_code,
-                                "name": product_data.get("Name", ""),
-                                "description": product_data.get("Description", ""),
-                                "price": product_data.get("Price", "")
-                            })
+        page = PageRequest.from_arguments(arguments)
+        menu = await await_store_menu(pizza_order.store)
+        
+        # Ranked top-k lookup in the menu's inverted index, one extra to detect a next page
+        products, next_cursor = page.slice(menu.index.search(query, limit=page.end + 1))
+        matching_items = [page.project(menu.table.to_dict(product)) for product in products]
         
         if not matching_items:
             return CallToolResult(
@@ -327,7 +574,7 @@ async def handle_search_menu(arguments: Dict[str, Any]) -> CallToolResult:
         return CallToolResult(
             content=[TextContent(
                 type="text",
-                text=f"Found {len(matching_items)} items:\n{json.dumps(matching_items, indent=2)}"
+                text=f"Found {len(matching_items)} items:\n{page.dumps(matching_items)}{next_page_hint(next_cursor)}"
             )]
         )
         
@@ -339,53 +586,84 @@ async def handle_search_menu(arguments: Dict[str, Any]) -> CallToolResult:
             )]
         )
 
+async def add_order_lines(pizza_order: PizzaOrder, items: Any) -> CallToolResult:
+    """Validate every line, then add them all (merged by item and options)"""
+    if not pizza_order.store:
+        return CallToolResult(
+            content=[TextContent(
+                type="text",
+                text="No store selected. Use find_dominos_store first."
+            )]
+        )
+    
+    lines = parse_lines(items)
+    
+    # Validate codes against the menu's catalog before touching the order
+    menu = await await_store_menu(pizza_order.store)
+    problems = validate_lines(lines, menu.catalog)
+    if problems:
+        return CallToolResult(
+            content=[TextContent(
+                type="text",
+                text="Cannot add items:\n" + "\n".join(f"- {problem}" for problem in problems)
+            )]
+        )
+    
+    if not pizza_order.order:
+        # Codes were checked against the cached menu above, so the order needs no menu of its own
+        pizza_order.order = ClientOrder(pizza_order.store)
+    
+    pizza_order.add_lines(lines)
+    added = []
+    for line in lines:
+        description = menu.catalog.describe(line["code"])
+        added.append(f"{line['quantity']}x {line['code']}{f' ({description})' if description else ''}")
+    
+    estimate = await estimate_cart(pizza_order)
+    return CallToolResult(
+        content=[TextContent(
+            type="text",
+            text=f"Added {', '.join(added)} to order\n{estimate.summary()}"
+        )]
+    )
+
 async def handle_add_to_order(arguments: Dict[str, Any]) -> CallToolResult:
     """Add item to order"""
+    pizza_order = order_sessions.current()
     try:
-        if not pizza_order.store:
-            return CallToolResult(
-                content=[TextContent(
-                    type="text",
-                    text="No store selected. Use find_dominos_store first."
-                )]
-            )
-        
-        if not pizza_order.order:
-            # Initialize order
-            pizza_order.order = Order(pizza_order.store)
-        
-        item_code = arguments["item_code"]
-        quantity = arguments.get("quantity", 1)
-        options = arguments.get("options", {})
-        
-        # Add item to order
-        for _ in range(quantity):
-            pizza_order.order.add_item(item_code, options)
-        
-        pizza_order.items.append({
-            "code": item_code,
-            "quantity": quantity,
-            "options": options
-        })
+        return await add_order_lines(pizza_order, [{
+            "item_code": arguments["item_code"],
+            "quantity": arguments.get("quantity", 1),
+            "options": arguments.get("options", {})
+        }])
         
+    except Exception as e:
         return CallToolResult(
             content=[TextContent(
                 type="text",
-                text=f"Added {quantity}x {item_code} to order"
+                text=f"Error adding item: {str(e)}"
             )]
         )
+
+async def handle_add_items_to_order(arguments: Dict[str, Any]) -> CallToolResult:
+    """Add many items to order"""
+    pizza_order = order_sessions.current()
+    try:
+        return await add_order_lines(pizza_order, arguments["items"])
         
     except Exception as e:
         return CallToolResult(
             content=[TextContent(
                 type="text",
-                text=f"Error adding item: {str(e)}"
+                text=f"Error adding items: {str(e)}"
             )]
         )
 
 async def handle_view_order(arguments: Dict[str, Any]) -> CallToolResult:
     """View current order"""
+    pizza_order = order_sessions.current()
     try:
+        since = parse_version(arguments.get("since_version"))
         if not pizza_order.order:
             return CallToolResult(
                 content=[TextContent(
@@ -394,12 +672,54 @@ async def handle_view_order(arguments: Dict[str, Any]) -> CallToolResult:
                 )]
             )
         
-        order_data = pizza_order.order.data
+        estimate = await estimate_cart(pizza_order)
+        version = pizza_order.versions.version
+        
+        if arguments.get("detail") == "full":
+            return CallToolResult(
+                content=[TextContent(
+                    type="text",
+                    text=f"Current order (version {version}):\n{json.dumps(pizza_order.items, indent=2)}\n\n{estimate.summary()}\n\nOrder data: {json.dumps(pizza_order.order.data, indent=2)}"
+                )]
+            )
+        
+        # Compact view; with since_version, only what changed after it
+        if since is not None and not 0 <= since <= version:
+            since = None
+        view: Dict[str, Any] = {"version": version}
+        if since is None:
+            view["lines"] = [compact_line(item) for item in pizza_order.items]
+            if pizza_order.coupons:
+                view["coupons"] = pizza_order.coupons
+        else:
+            if since == version:
+                return CallToolResult(
+                    content=[TextContent(
+                        type="text",
+                        text=f"No changes since version {version}."
+                    )]
+                )
+            changed = pizza_order.versions.changed_since(since)
+            view["since_version"] = since
+            view["changed_lines"] = [
+                compact_line(item) for item in pizza_order.items
+                if line_key(item["code"], item["options"]) in changed
+            ]
+            if "coupons" in changed:
+                view["coupons"] = pizza_order.coupons
+            if "store" in changed or "customer" in changed:
+                view["changed"] = sorted(changed & {"store", "customer"})
+        view["quantity"] = estimate.quantity
+        view["estimated_subtotal"] = estimate.subtotal
+        if estimate.unpriced:
+            view["unpriced"] = sorted(set(estimate.unpriced))
+        if estimate.short_of_min_delivery and estimate.complete:
+            view["short_of_min_delivery"] = estimate.short_of_min_delivery
         
         return CallToolResult(
             content=[TextContent(
                 type="text",
-                text=f"Current order:\n{json.dumps(pizza_order.items, indent=2)}\n\nOrder data: {json.dumps(order_data, indent=2)}"
+                text=json.dumps(view, separators=(",", ":"))
             )]
         )
         
@@ -413,6 +733,7 @@ async def handle_view_order(arguments: Dict[str, Any]) -> CallToolResult:
 
 async def handle_set_customer_info(arguments: Dict[str, Any]) -> CallToolResult:
     """Set customer information"""
+    pizza_order = order_sessions.current()
     try:
         customer_data = {
             "FirstName": arguments["first_name"],
@@ -427,7 +748,7 @@ async def handle_set_customer_info(arguments: Dict[str, Any]) -> CallToolResult:
             }
         }
         
-        pizza_order.customer = Customer(
+        pizza_order.set_customer(Customer(
             first_name=arguments["first_name"],
             last_name=arguments["last_name"],
             email=arguments["email"], 
@@ -438,7 +759,7 @@ async def handle_set_customer_info(arguments: Dict[str, Any]) -> CallToolResult:
                 state=arguments["address"]["region"],
                 zip=arguments["address"]["zip"]
             )
-        )
+        ), customer_data)
         
         return CallToolResult(
             content=[TextContent(
@@ -457,6 +778,7 @@ async def handle_set_customer_info(arguments: Dict[str, Any]) -> CallToolResult:
 
 async def handle_calculate_order_total(arguments: Dict[str, Any]) -> CallToolResult:
     """Calculate order total"""
+    pizza_order = order_sessions.current()
     try:
         if not pizza_order.order:
             return CallToolResult(
@@ -466,10 +788,26 @@ async def handle_calculate_order_total(arguments: Dict[str, Any]) -> CallToolRes
                 )]
             )
         
+        # Menu prices answer without a round trip; Domino's prices the order
+        # exactly on request, and always when it is placed
+        if not arguments.get("exact", False):
+            estimate = await estimate_cart(pizza_order)
+            if estimate.complete:
+                return CallToolResult(
+                    content=[TextContent(
+                        type="text",
+                        text=f"Estimated order total (menu prices before tax, delivery fees and coupons; use exact=true for Domino's total):\n{json.dumps(estimate.to_dict(), indent=2)}"
+                    )]
+                )
+        
         if pizza_order.customer:
-            pizza_order.order.set_customer(pizza_order.customer)
+            pizza_order.order.set_customer(pizza_order.customer, pizza_order.customer_data["Address"])
         
-        # Get order pricing
+        # Price the order with Domino's, which fills in its Amounts,
+        # unless it was already priced as it is now
+        if pizza_order.order.data.get("Products") and not pizza_order.priced:
+            await price_order(pizza_order.order)
+            pizza_order.mark_priced()
         order_data = pizza_order.order.data
         
         return CallToolResult(
@@ -489,6 +827,7 @@ async def handle_calculate_order_total(arguments: Dict[str, Any]) -> CallToolRes
 
 async def handle_apply_coupon(arguments: Dict[str, Any]) -> CallToolResult:
     """Apply coupon to order"""
+    pizza_order = order_sessions.current()
     try:
         if not pizza_order.order:
             return CallToolResult(
@@ -498,15 +837,56 @@ async def handle_apply_coupon(arguments: Dict[str, Any]) -> CallToolResult:
                 )]
             )
         
-        coupon_code = arguments["coupon_code"]
+        coupon_code = arguments["coupon_code"].strip()
+        if normalize_code(coupon_code) in {normalize_code(code) for code in pizza_order.coupons}:
+            return CallToolResult(
+                content=[TextContent(
+                    type="text",
+                    text=f"Coupon {coupon_code} is already applied."
+                )]
+            )
+        
+        # Check the coupon against the store's cached coupon catalog; menus
+        # without coupon data (such as snapshots) leave it to Domino's
+        menu = await await_store_menu(pizza_order.store)
+        detail = ""
+        if len(menu.coupons):
+            if coupon_code not in menu.coupons:
+                suggestions = menu.coupons.suggest(coupon_code)
+                return CallToolResult(
+                    content=[TextContent(
+                        type="text",
+                        text=f"Unknown coupon code '{coupon_code}' for this store"
+                        + (f". Did you mean: {', '.join(suggestions)}?" if suggestions else ".")
+                    )]
+                )
+            # Domino's expects the code as the menu spells it
+            coupon_code = menu.coupons.get(coupon_code).code
+            estimate = await estimate_cart(pizza_order)
+            check = menu.coupons.check(
+                coupon_code, pizza_order.items, menu,
+                service_method=pizza_order.order.data.get("ServiceMethod", "Delivery"),
+                subtotal=estimate.subtotal if estimate.complete else None,
+            )
+            if not check.eligible:
+                return CallToolResult(
+                    content=[TextContent(
+                        type="text",
+                        text=f"Coupon {coupon_code} ({check.coupon.name}) doesn't apply to this order yet:\n"
+                        + "\n".join(f"- {problem}" for problem in check.problems)
+                    )]
+                )
+            detail = f" ({check.coupon.name})"
+            if check.savings is not None:
+                detail += f"\nEstimated savings: ${check.savings:.2f}"
         
         # Apply coupon
-        pizza_order.order.add_coupon(coupon_code)
+        pizza_order.add_coupon(coupon_code)
         
         return CallToolResult(
             content=[TextContent(
                 type="text",
-                text=f"Applied coupon: {coupon_code}"
+                text=f"Applied coupon: {coupon_code}{detail}"
             )]
         )
         
@@ -520,6 +900,7 @@ async def handle_apply_coupon(arguments: Dict[str, Any]) -> CallToolResult:
 
 async def handle_place_order(arguments: Dict[str, Any]) -> CallToolResult:
     """Place the order"""
+    pizza_order = order_sessions.current()
     try:
         if not pizza_order.order:
             return CallToolResult(
@@ -540,7 +921,7 @@ async def handle_place_order(arguments: Dict[str, Any]) -> CallToolResult:
         payment_info = arguments["payment_info"]
         
         # Set customer info on order
-        pizza_order.order.set_customer(pizza_order.customer)
+        pizza_order.order.set_customer(pizza_order.customer, pizza_order.customer_data["Address"])
         
         # Handle payment based on type
         if payment_info["type"] == "cash":
@@ -571,10 +952,11 @@ async def handle_place_order(arguments: Dict[str, Any]) -> CallToolResult:
             # Add tip if provided
             tip_amount = payment_info.get("tip_amount", 0)
             if tip_amount > 0:
-                pizza_order.order.add_item({'Code': 'DELIVERY_TIP', 'Qty': 1, 'Price': tip_amount})
+                pizza_order.order.add_item("DELIVERY_TIP")["Price"] = tip_amount
+                pizza_order.touch()
             
             # Place the actual order
-            result = pizza_order.order.place(card)
+            result = await place_order(pizza_order.order, card)
             
         else:
             return CallToolResult(
@@ -601,6 +983,13 @@ async def handle_place_order(arguments: Dict[str, Any]) -> CallToolResult:
                 )]
             )
         
+    except UpstreamTimeout as e:
+        return CallToolResult(
+            content=[TextContent(
+                type="text",
+                text=f"Error placing order: {str(e)}. The order may still have gone through; check with the store before placing it again."
+            )]
+        )
     except Exception as e:
         return CallToolResult(
             content=[TextContent(
@@ -612,9 +1001,11 @@ async def handle_place_order(arguments: Dict[str, Any]) -> CallToolResult:
 # Tool handlers mapping
 TOOL_HANDLERS = {
     "find_dominos_store": handle_find_dominos_store,
+    "find_dominos_stores": handle_find_dominos_stores,
     "get_store_menu": handle_get_store_menu,
     "search_menu": handle_search_menu,
     "add_to_order": handle_add_to_order,
+    "add_items_to_order": handle_add_items_to_order,
     "view_order": handle_view_order,
     "set_customer_info": handle_set_customer_info,
     "calculate_order_total": handle_calculate_order_total,
@@ -638,7 +1029,9 @@ def create_server() -> Server:
             raise ValueError(f"Unknown tool: {request.params.name}")
         
         handler = TOOL_HANDLERS[request.params.name]
-        return await handler(request.params.arguments or {})
+        # Calls within one session run in order; other sessions aren't blocked
+        async with order_sessions.use_async(session_key(server)):
+            return await handler(request.params.arguments or {})
 
     return server
 
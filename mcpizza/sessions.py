@@ -0,0 +1,355 @@
+"""
+MCPizza order sessions
+
+Order state (store, customer, cart) scoped to one MCP session or client
+connection instead of one per process, so concurrent conversations don't
+overwrite each other's orders. Each session has its own lock: calls within
+a session run one at a time while different sessions proceed in parallel.
+
+Tool code reads the active session's state through current(), which is set
+for the duration of use() / use_async().
+
+Sessions idle longer than the idle TTL are dropped, and beyond the session
+cap the least recently used idle session is evicted. With a spill
+directory configured, sessions evicted by the cap are pickled to disk and
+restored on their next request instead of being lost; spilled sessions
+nobody comes back for are pruned after the spill TTL. Disk I/O happens
+outside the store lock so it never holds up other sessions.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set
+
+logger = logging.getLogger("mcpizza")
+
+DEFAULT_SESSION = "default"
+DEFAULT_IDLE_TTL_SECONDS = 30 * 60.0
+DEFAULT_MAX_SESSIONS = 1000
+DEFAULT_SPILL_TTL_SECONDS = 24 * 60 * 60.0
+# Seconds between scans of the spill directory for expired sessions
+SPILL_PRUNE_INTERVAL_SECONDS = 10 * 60.0
+# Sessions pickled per stats() call to estimate the resident size of all of them
+STATS_SAMPLE_SIZE = 16
+
+# HTTP header clients use to keep their order across requests
+SESSION_HEADER = "Mcp-Session-Id"
+
+
+def new_session_id() -> str:
+    """A fresh, unguessable session id for the Mcp-Session-Id response header"""
+    return uuid.uuid4().hex
+
+
+def estimate_state_size(state: Any) -> int:
+    """Rough resident size of a session's state, measured as its pickled length"""
+    try:
+        return len(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class Session:
+    """One session's order state and its lock"""
+
+    __slots__ = ("key", "state", "lock", "active", "last_used", "_async_lock")
+
+    def __init__(self, key: str, state: Any, now: float):
+        self.key = key
+        self.state = state
+        self.lock = threading.RLock()
+        self.active = 0
+        self.last_used = now
+        self._async_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def async_lock(self) -> asyncio.Lock:
+        # Created on first use, inside the event loop
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+
+class SessionStore:
+    """Order state per session key, created on first use and evicted when idle"""
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        idle_ttl: float = DEFAULT_IDLE_TTL_SECONDS,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        spill_dir: Optional[str] = None,
+        spill_ttl: float = DEFAULT_SPILL_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._factory = factory
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.spill_dir = spill_dir
+        self.spill_ttl = spill_ttl
+        self._clock = clock
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Keys being read back from disk, and states evicted but not yet on disk
+        self._restoring: Set[str] = set()
+        self._restore_done = threading.Condition(self._lock)
+        self._spilling: Dict[str, Any] = {}
+        self._next_prune = clock() + SPILL_PRUNE_INTERVAL_SECONDS
+        self._pruning = False
+        self._current: "contextvars.ContextVar[Optional[Session]]" = contextvars.ContextVar("mcpizza_session", default=None)
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.spilled = 0
+        self.restored = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._prune_spilled()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sessions
+
+    def get(self, key: Optional[str] = None) -> Session:
+        return self._checkout(key or DEFAULT_SESSION, acquire=False)
+
+    def _checkout(self, key: str, acquire: bool) -> Session:
+        """The session for key, restored or created if needed (and counted active when acquiring)"""
+        with self._lock:
+            while key in self._restoring:
+                self._restore_done.wait()
+            session = self._sessions.get(key)
+            state = None
+            if session is None:
+                state = self._spilling.pop(key, None)
+                if state is None and self.spill_dir:
+                    # Read the spill file without holding up other sessions
+                    self._restoring.add(key)
+                    self._lock.release()
+                    try:
+                        state = self._restore(key)
+                    finally:
+                        self._lock.acquire()
+                        self._restoring.discard(key)
+                        self._restore_done.notify_all()
+                if state is not None:
+                    self.restored += 1
+            now = self._clock()
+            if session is None:
+                if state is None:
+                    state = self._factory()
+                    self.created += 1
+                session = self._sessions[key] = Session(key, state, now)
+            else:
+                self._sessions.move_to_end(key)
+            session.last_used = now
+            if acquire:
+                session.active += 1
+            evicted = self._sweep(now, keep=key)
+        self._spill(evicted)
+        self._prune_if_due()
+        return session
+
+    def _sweep(self, now: float, keep: Optional[str] = None) -> List[Session]:
+        """Drop expired sessions (oldest first) and evict beyond the cap; sessions in use are kept
+
+        Returns the sessions evicted by the cap, to be spilled once the lock is released.
+        """
+        for session in list(self._sessions.values()):
+            if now - session.last_used < self.idle_ttl:
+                break
+            if not session.active and session.key != keep:
+                del self._sessions[session.key]
+                self.expired += 1
+        evicted: List[Session] = []
+        if len(self._sessions) > self.max_sessions:
+            for session in list(self._sessions.values()):
+                if len(self._sessions) <= self.max_sessions:
+                    break
+                if not session.active and session.key != keep:
+                    del self._sessions[session.key]
+                    self.evicted += 1
+                    if self.spill_dir:
+                        self._spilling[session.key] = session.state
+                        evicted.append(session)
+        return evicted
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".session")
+
+    def _spill(self, sessions: List[Session]) -> None:
+        """Pickle evicted sessions to disk; call without holding the lock"""
+        for session in sessions:
+            path = self._spill_path(session.key)
+            # A session can be evicted again while an earlier spill of it is still being written
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(session.state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                logger.warning(f"Could not spill session {session.key}: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                with self._lock:
+                    if self._spilling.get(session.key) is session.state:
+                        del self._spilling[session.key]
+                continue
+            with self._lock:
+                # Skip the rename if the session came back while it was being written
+                current = self._spilling.get(session.key) is session.state
+                if current:
+                    os.replace(tmp_path, path)
+                    del self._spilling[session.key]
+                    self.spilled += 1
+            if not current:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _restore(self, key: str) -> Optional[Any]:
+        path = self._spill_path(key)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not restore session {key}: {e}")
+            state = None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return state
+
+    def _prune_if_due(self) -> None:
+        if not self.spill_dir:
+            return
+        with self._lock:
+            if self._pruning or self._clock() < self._next_prune:
+                return
+            self._pruning = True
+        try:
+            self._prune_spilled()
+        finally:
+            with self._lock:
+                self._pruning = False
+                self._next_prune = self._clock() + SPILL_PRUNE_INTERVAL_SECONDS
+
+    def _prune_spilled(self) -> None:
+        """Delete spilled sessions nobody came back for within the spill TTL"""
+        cutoff = time.time() - self.spill_ttl
+        for entry in os.scandir(self.spill_dir):
+            try:
+                if entry.name.endswith(".session") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def current(self) -> Any:
+        """State of the session in use, or of the default session outside use()"""
+        session = self._current.get()
+        return (session or self.get()).state
+
+    def _acquire(self, key: Optional[str]) -> Session:
+        return self._checkout(key or DEFAULT_SESSION, acquire=True)
+
+    def _release(self, session: Session) -> None:
+        with self._lock:
+            session.active -= 1
+            session.last_used = self._clock()
+            if self._sessions.get(session.key) is session:
+                self._sessions.move_to_end(session.key)
+
+    @contextmanager
+    def use(self, key: Optional[str]) -> Iterator[Any]:
+        """Hold a session's lock and make it current (for threads)"""
+        session = self._acquire(key)
+        try:
+            with session.lock:
+                token = self._current.set(session)
+                try:
+                    yield session.state
+                finally:
+                    self._current.reset(token)
+        finally:
+            self._release(session)
+
+    @asynccontextmanager
+    async def use_async(self, key: Optional[str]) -> AsyncIterator[Any]:
+        """Hold a session's lock and make it current (for coroutines)"""
+        session = self._acquire(key)
+        try:
+            async with session.async_lock:
+                token = self._current.set(session)
+                try:
+                    yield session.state
+                finally:
+                    self._current.reset(token)
+        finally:
+            self._release(session)
+
+    def run(self, key: Optional[str], fn: Callable[..., Any], *args: Any) -> Any:
+        """Call fn inside a session"""
+        with self.use(key):
+            return fn(*args)
+
+    def sweep(self) -> None:
+        """Expire idle sessions now rather than on the next request, and prune the spill directory when due"""
+        with self._lock:
+            evicted = self._sweep(self._clock())
+        self._spill(evicted)
+        self._prune_if_due()
+
+    def stats(self) -> Dict[str, Any]:
+        self.sweep()
+        with self._lock:
+            count = len(self._sessions)
+            sample: List[Any] = [
+                session.state for session in random.sample(list(self._sessions.values()), min(count, STATS_SAMPLE_SIZE))
+            ]
+            stats = {
+                "sessions": count,
+                "max_sessions": self.max_sessions,
+                "idle_ttl_seconds": self.idle_ttl,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "spilled": self.spilled,
+                "restored": self.restored,
+            }
+        # Sizing pickles states, so only a sample is sized, outside the lock, and scaled up
+        sizes = [estimate_state_size(state) for state in sample]
+        stats["bytes"] = sum(sizes) * count // len(sizes) if sizes else 0
+        stats["bytes_sampled_sessions"] = len(sizes)
+        return stats
+
+
+def session_store_from_env(factory: Callable[[], Any]) -> SessionStore:
+    """Build a SessionStore configured from MCPIZZA_SESSION_* environment variables"""
+    return SessionStore(
+        factory,
+        idle_ttl=float(os.getenv("MCPIZZA_SESSION_IDLE_TTL", DEFAULT_IDLE_TTL_SECONDS)),
+        max_sessions=int(os.getenv("MCPIZZA_SESSION_MAX", DEFAULT_MAX_SESSIONS)),
+        spill_dir=os.getenv("MCPIZZA_SESSION_SPILL_DIR") or None,
+        spill_ttl=float(os.getenv("MCPIZZA_SESSION_SPILL_TTL", DEFAULT_SPILL_TTL_SECONDS)),
+    )
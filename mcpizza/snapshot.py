@@ -0,0 +1,311 @@
+"""
+MCPizza menu snapshots
+
+A versioned binary file holding parsed store menus (product table columns,
+search index postings and orderable variants) so that serverless cold
+starts can answer menu tools without fetching menus from Domino's.
+
+The file is memory-mapped and only the sections of stores that are actually
+requested are read. Numeric columns (prices, category ids, postings) are
+used in place through memoryview casts rather than copied.
+
+Layout (native byte order, recorded in the header):
+
+    header     magic, version, byte order, store count, directory offset
+    sections   one per store, 8-byte aligned
+    directory  store id, section offset, section length, saved-at time
+
+Build one from live menus with:
+
+    python -m mcpizza.snapshot menus.snap 4336 7922
+"""
+
+import bisect
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .catalog import OptionCatalog, Variant
+from .menu_index import MIN_PREFIX_LENGTH, PREFIX_FACTOR, MenuIndex
+from .menu_table import MenuTable, Product
+
+logger = logging.getLogger("mcpizza")
+
+MAGIC = b"MCPZSNAP"
+VERSION = 2
+
+_HEADER = struct.Struct("<8sHHIQ")
+_DIRECTORY_ENTRY = struct.Struct("<QQd")
+_SECTION_HEADER = struct.Struct("<IIIII")
+_BYTE_ORDERS = {"little": 1, "big": 2}
+# Strings stored per variant: code, product code, name, size code, flavor code
+_VARIANT_STRINGS = 5
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or from another version"""
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _pack_section(table: MenuTable, index: Any, catalog: OptionCatalog) -> bytes:
+    """Serialize one store's table columns, index postings and variants"""
+    token_postings = index.token_postings()
+    terms = sorted(token_postings)
+    variants = list(catalog.variants.values())
+    strings: List[str] = list(table.categories)
+    for product in table.products:
+        strings.extend((product.code, product.name, product.description))
+    strings.extend(terms)
+    for variant in variants:
+        strings.extend((variant.code, variant.product_code, variant.name, variant.size_code, variant.flavor_code))
+
+    heap = bytearray()
+    string_offsets = array("I", [0])
+    for value in strings:
+        heap += value.encode("utf-8")
+        string_offsets.append(len(heap))
+
+    term_offsets = array("I", [0])
+    posting_docs = array("I")
+    posting_weights = array("f")
+    for term in terms:
+        for doc_id, weight in sorted(token_postings[term].items()):
+            posting_docs.append(doc_id)
+            posting_weights.append(weight)
+        term_offsets.append(len(posting_docs))
+
+    columns = [
+        array("d", (product.price for product in table.products)).tobytes(),
+        array("I", (product.category_id for product in table.products)).tobytes(),
+        string_offsets.tobytes(),
+        term_offsets.tobytes(),
+        posting_docs.tobytes(),
+        posting_weights.tobytes(),
+        array("d", (variant.price for variant in variants)).tobytes(),
+        bytes(heap),
+    ]
+    section = bytearray(_SECTION_HEADER.pack(
+        len(table.categories), len(table.products), len(terms), len(posting_docs), len(variants)
+    ))
+    for column in columns:
+        section += b"\0" * (_align(len(section)) - len(section))
+        section += column
+    return bytes(section)
+
+
+def write_snapshot(path: str, store_menus: Iterable[Any]) -> int:
+    """Write store menus (objects with store_id, table, index and catalog) to path; returns the store count"""
+    tmp_path = f"{path}.tmp"
+    directory: List[Tuple[str, int, int]] = []
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        for store_menu in store_menus:
+            offset = _align(f.tell())
+            f.write(b"\0" * (offset - f.tell()))
+            section = _pack_section(store_menu.table, store_menu.index, store_menu.catalog)
+            f.write(section)
+            directory.append((str(store_menu.store_id), offset, len(section)))
+
+        directory_offset = f.tell()
+        saved_at = time.time()
+        for store_id, offset, length in directory:
+            encoded = store_id.encode("utf-8")
+            f.write(struct.pack("<H", len(encoded)) + encoded)
+            f.write(_DIRECTORY_ENTRY.pack(offset, length, saved_at))
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, _BYTE_ORDERS[sys.byteorder], len(directory), directory_offset))
+    os.replace(tmp_path, path)
+    return len(directory)
+
+
+class SnapshotIndex(MenuIndex):
+    """MenuIndex whose postings are read in place from a snapshot section"""
+
+    def __init__(self, products: List[Product], terms: List[str], term_offsets: memoryview,
+                 posting_docs: memoryview, posting_weights: memoryview):
+        super().__init__()
+        self.products = products
+        self._codes = {product.code.lower(): doc_id for doc_id, product in enumerate(products)}
+        self._terms = terms
+        self._term_offsets = term_offsets
+        self._posting_docs = posting_docs
+        self._posting_weights = posting_weights
+
+    def _term_postings(self, term_id: int) -> Iterable[Tuple[int, float]]:
+        start, end = self._term_offsets[term_id], self._term_offsets[term_id + 1]
+        return zip(self._posting_docs[start:end], self._posting_weights[start:end])
+
+    def _postings(self, token: str) -> Dict[int, float]:
+        # Terms are sorted, so every term extending the token is one contiguous run
+        scores: Dict[int, float] = {}
+        term_id = bisect.bisect_left(self._terms, token)
+        while term_id < len(self._terms) and self._terms[term_id].startswith(token):
+            exact = self._terms[term_id] == token
+            if exact or len(token) >= MIN_PREFIX_LENGTH:
+                factor = 1.0 if exact else PREFIX_FACTOR
+                for doc_id, weight in self._term_postings(term_id):
+                    if scores.get(doc_id, 0.0) < weight * factor:
+                        scores[doc_id] = weight * factor
+            term_id += 1
+        return scores
+
+
+class MenuSnapshot:
+    """Read-only, memory-mapped view of a snapshot file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Cannot open menu snapshot {path}: {e}")
+        self._view = memoryview(self._mmap)
+        self._directory: Dict[str, Tuple[int, int, float]] = {}
+        self._read_directory()
+
+    def __len__(self) -> int:
+        return len(self._directory)
+
+    def __contains__(self, store_id: Any) -> bool:
+        return str(store_id) in self._directory
+
+    def store_ids(self) -> List[str]:
+        return list(self._directory)
+
+    def saved_at(self, store_id: Any) -> Optional[float]:
+        entry = self._directory.get(str(store_id))
+        return None if entry is None else entry[2]
+
+    def section_size(self, store_id: Any) -> int:
+        entry = self._directory.get(str(store_id))
+        return 0 if entry is None else entry[1]
+
+    def _read_directory(self) -> None:
+        if len(self._mmap) < _HEADER.size:
+            raise SnapshotError(f"{self.path} is not a menu snapshot")
+        magic, version, byte_order, count, offset = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a menu snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"{self.path} has snapshot version {version}, expected {VERSION}")
+        if byte_order != _BYTE_ORDERS[sys.byteorder]:
+            raise SnapshotError(f"{self.path} was written on a machine with a different byte order")
+
+        for _ in range(count):
+            (id_length,) = struct.unpack_from("<H", self._mmap, offset)
+            offset += 2
+            store_id = bytes(self._view[offset:offset + id_length]).decode("utf-8")
+            offset += id_length
+            self._directory[store_id] = _DIRECTORY_ENTRY.unpack_from(self._mmap, offset)
+            offset += _DIRECTORY_ENTRY.size
+
+    def load(self, store_id: Any) -> Optional[Tuple[MenuTable, MenuIndex, OptionCatalog]]:
+        """Table, index and variant catalog for one store, or None if the snapshot doesn't have it
+
+        The catalog has variants only (no topping, size or crust names), so
+        topping options aren't checked for snapshot menus.
+        """
+        entry = self._directory.get(str(store_id))
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        section = self._view[offset:offset + length]
+
+        n_categories, n_products, n_terms, n_postings, n_variants = _SECTION_HEADER.unpack_from(section, 0)
+        position = _SECTION_HEADER.size
+
+        def column(fmt: str, count: int) -> memoryview:
+            nonlocal position
+            start = _align(position)
+            position = start + count * struct.calcsize(fmt)
+            return section[start:position].cast(fmt)
+
+        prices = column("d", n_products)
+        category_ids = column("I", n_products)
+        string_offsets = column("I", n_categories + 3 * n_products + n_terms + _VARIANT_STRINGS * n_variants + 1)
+        term_offsets = column("I", n_terms + 1)
+        posting_docs = column("I", n_postings)
+        posting_weights = column("f", n_postings)
+        variant_prices = column("d", n_variants)
+        heap = section[_align(position):]
+
+        def string(i: int) -> str:
+            return str(heap[string_offsets[i]:string_offsets[i + 1]], "utf-8")
+
+        table = MenuTable()
+        for category_id in range(n_categories):
+            table.category_id(string(category_id))
+        for doc_id in range(n_products):
+            base = n_categories + 3 * doc_id
+            table.add_product(Product.create(string(base), string(base + 1), string(base + 2), prices[doc_id], category_ids[doc_id]))
+
+        terms_base = n_categories + 3 * n_products
+        terms = [string(terms_base + term_id) for term_id in range(n_terms)]
+        index = SnapshotIndex(table.products, terms, term_offsets, posting_docs, posting_weights)
+
+        catalog = OptionCatalog()
+        catalog.products.update(product.code for product in table)
+        variants_base = terms_base + n_terms
+        for i in range(n_variants):
+            code, product_code, name, size_code, flavor_code = (
+                string(variants_base + _VARIANT_STRINGS * i + field) for field in range(_VARIANT_STRINGS)
+            )
+            catalog.variants[code] = Variant(code, product_code, name, size_code, flavor_code, variant_prices[i])
+        return table, index, catalog
+
+
+_snapshot: Optional[MenuSnapshot] = None
+_snapshot_loaded = False
+
+
+def get_menu_snapshot() -> Optional[MenuSnapshot]:
+    """The snapshot named by MCPIZZA_MENU_SNAPSHOT, opened on first use"""
+    global _snapshot, _snapshot_loaded
+    if not _snapshot_loaded:
+        _snapshot_loaded = True
+        path = os.getenv("MCPIZZA_MENU_SNAPSHOT")
+        if path:
+            try:
+                _snapshot = MenuSnapshot(path)
+                logger.info(f"Loaded menu snapshot {path} with {len(_snapshot)} stores")
+            except SnapshotError as e:
+                logger.warning(str(e))
+    return _snapshot
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Fetch menus for the given store IDs and write them to a snapshot file"""
+    import argparse
+
+    from .dominos import ClientStore
+    from .menu_cache import StoreMenu
+
+    parser = argparse.ArgumentParser(description="Build an MCPizza menu snapshot")
+    parser.add_argument("output", help="Snapshot file to write")
+    parser.add_argument("store_ids", nargs="+", help="Domino's store IDs to include")
+    args = parser.parse_args(argv)
+
+    store_menus = []
+    for store_id in args.store_ids:
+        try:
+            store_menus.append(StoreMenu(store_id, ClientStore({"StoreID": store_id}).get_menu()))
+        except Exception as e:
+            logger.error(f"Skipping store {store_id}: {e}")
+    count = write_snapshot(args.output, store_menus)
+    print(f"Wrote {count} store menus to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
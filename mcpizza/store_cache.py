@@ -0,0 +1,294 @@
+"""
+MCPizza store locator cache
+
+Caches StoreLocator results by normalized address. A store's static details
+(ID, phone, address, delivery flags) are kept for a long TTL while its
+estimated wait times expire quickly and are refreshed from the store
+profile, which is cheaper than repeating the locator search.
+"""
+
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .singleflight import SingleFlight
+from .upstream import BATCH_TIMEOUT
+
+logger = logging.getLogger("mcpizza")
+
+DEFAULT_STATIC_TTL_SECONDS = 24 * 60 * 60.0
+DEFAULT_WAIT_TTL_SECONDS = 300.0
+DEFAULT_MAX_ADDRESSES = 10000
+DEFAULT_BATCH_WORKERS = 8
+MAX_BATCH_ADDRESSES = 100
+# Batch lookups stop this long before MCPIZZA_BATCH_TIMEOUT so callers get partial results
+BATCH_DEADLINE_MARGIN_SECONDS = 1.0
+
+WAIT_TIME_FIELD = "ServiceEstimatedWaitMinutes"
+
+_ZIP_PLUS_FOUR_RE = re.compile(r"\b(\d{5})-\d{4}\b")
+_PUNCTUATION_RE = re.compile(r"[.,;#]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+ADDRESS_ABBREVIATIONS = {
+    "STREET": "ST",
+    "AVENUE": "AVE",
+    "ROAD": "RD",
+    "BOULEVARD": "BLVD",
+    "DRIVE": "DR",
+    "LANE": "LN",
+    "COURT": "CT",
+    "PLACE": "PL",
+    "TERRACE": "TER",
+    "PARKWAY": "PKWY",
+    "HIGHWAY": "HWY",
+    "CIRCLE": "CIR",
+    "SQUARE": "SQ",
+    "TRAIL": "TRL",
+    "SUITE": "STE",
+    "APARTMENT": "APT",
+    "NORTH": "N",
+    "SOUTH": "S",
+    "EAST": "E",
+    "WEST": "W",
+    "NORTHEAST": "NE",
+    "NORTHWEST": "NW",
+    "SOUTHEAST": "SE",
+    "SOUTHWEST": "SW",
+}
+
+
+def normalize_address(address: str) -> str:
+    """Canonical form of an address for cache keys
+
+    Uppercases, strips punctuation and ZIP+4 suffixes, collapses whitespace
+    and abbreviates street types and directionals, so "123 Main Street,
+    Springfield 62704-1234" and "123 main st springfield 62704" match.
+    """
+    address = _ZIP_PLUS_FOUR_RE.sub(r"\1", address.upper())
+    address = _PUNCTUATION_RE.sub(" ", address)
+    words = _WHITESPACE_RE.split(address.strip())
+    return " ".join(ADDRESS_ABBREVIATIONS.get(word, word) for word in words if word)
+
+
+class _StoreEntry:
+    __slots__ = ("store", "expires_at", "wait_expires_at")
+
+    def __init__(self, store: Any, expires_at: float, wait_expires_at: float):
+        self.store = store
+        self.expires_at = expires_at
+        self.wait_expires_at = wait_expires_at
+
+
+class StoreLocatorCache:
+    """Normalized address -> nearest store, with separate static and wait-time TTLs"""
+
+    def __init__(
+        self,
+        static_ttl: float = DEFAULT_STATIC_TTL_SECONDS,
+        wait_ttl: float = DEFAULT_WAIT_TTL_SECONDS,
+        max_addresses: int = DEFAULT_MAX_ADDRESSES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.static_ttl = static_ttl
+        self.wait_ttl = wait_ttl
+        self.max_addresses = max_addresses
+        self._clock = clock
+        self._addresses: "OrderedDict[str, str]" = OrderedDict()
+        self._stores: Dict[str, _StoreEntry] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.wait_refreshes = 0
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+    def lookup(self, address: str, count: bool = True) -> Tuple[Optional[Any], bool]:
+        """The cached store for an address and whether its wait times are still fresh"""
+        key = normalize_address(address)
+        now = self._clock()
+        with self._lock:
+            store_id = self._addresses.get(key)
+            entry = self._stores.get(store_id) if store_id is not None else None
+            if entry is None or entry.expires_at <= now:
+                if count:
+                    self.misses += 1
+                return None, False
+            self._addresses.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry.store, entry.wait_expires_at > now
+
+    def put(self, address: str, store: Any) -> None:
+        key = normalize_address(address)
+        store_id = str(store.data.get("StoreID"))
+        now = self._clock()
+        with self._lock:
+            self._addresses[key] = store_id
+            self._addresses.move_to_end(key)
+            self._stores[store_id] = _StoreEntry(store, now + self.static_ttl, now + self.wait_ttl)
+            while len(self._addresses) > self.max_addresses:
+                self._addresses.popitem(last=False)
+            if len(self._stores) > self.max_addresses:
+                live = set(self._addresses.values())
+                for stale_id in [sid for sid in self._stores if sid not in live]:
+                    del self._stores[stale_id]
+
+    def update_wait_times(self, store: Any, wait_minutes: Optional[Dict[str, Any]]) -> None:
+        """Record freshly fetched wait times for a cached store"""
+        store_id = str(store.data.get("StoreID"))
+        with self._lock:
+            if wait_minutes is not None:
+                store.data[WAIT_TIME_FIELD] = wait_minutes
+            entry = self._stores.get(store_id)
+            if entry is not None:
+                entry.wait_expires_at = self._clock() + self.wait_ttl
+            self.wait_refreshes += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._addresses.clear()
+            self._stores.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "addresses": len(self._addresses),
+                "stores": len(self._stores),
+                "static_ttl_seconds": self.static_ttl,
+                "wait_ttl_seconds": self.wait_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "wait_refreshes": self.wait_refreshes,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def store_cache_from_env() -> StoreLocatorCache:
+    """Build a StoreLocatorCache configured from MCPIZZA_STORE_CACHE_* environment variables"""
+    return StoreLocatorCache(
+        static_ttl=float(os.getenv("MCPIZZA_STORE_CACHE_TTL", DEFAULT_STATIC_TTL_SECONDS)),
+        wait_ttl=float(os.getenv("MCPIZZA_STORE_CACHE_WAIT_TTL", DEFAULT_WAIT_TTL_SECONDS)),
+        max_addresses=int(os.getenv("MCPIZZA_STORE_CACHE_MAX_ADDRESSES", DEFAULT_MAX_ADDRESSES)),
+    )
+
+
+# Shared locator cache used by every find_dominos_store implementation
+store_cache = store_cache_from_env()
+
+
+# Coalesces concurrent locator searches per normalized address and profile
+# fetches per store
+locator_flight = SingleFlight()
+
+
+def _refresh_wait_times(store: Any) -> None:
+    def refresh() -> None:
+        details = store.get_details()
+        store_cache.update_wait_times(store, details.get(WAIT_TIME_FIELD) if isinstance(details, dict) else None)
+
+    try:
+        locator_flight.do(("profile", str(store.data.get("StoreID"))), refresh)
+    except Exception as e:
+        # Stale wait times beat failing the lookup
+        logger.warning(f"Could not refresh wait times for store {store.data.get('StoreID')}: {e}")
+
+
+def _locate(address: str, locator: Callable[[str], Any]) -> Any:
+    # Re-check inside the flight: a search may have finished since the miss
+    store, _ = store_cache.lookup(address, count=False)
+    if store is None:
+        store = locator(address)
+        if store:
+            store_cache.put(address, store)
+            # Stores answered from a registry snapshot carry no live wait times
+            if WAIT_TIME_FIELD not in store.data:
+                _refresh_wait_times(store)
+    return store
+
+
+def find_closest_store(address: str, locator: Callable[[str], Any]) -> Any:
+    """Nearest store to an address, calling locator (StoreLocator.find_closest_store_to_customer) on a miss
+
+    Concurrent misses for the same normalized address share one locator call.
+    """
+    store, wait_fresh = store_cache.lookup(address)
+    if store is None:
+        store = locator_flight.do(("locate", normalize_address(address)), lambda: _locate(address, locator))
+    elif not wait_fresh:
+        _refresh_wait_times(store)
+    return store
+
+
+_batch_executor: Optional[ThreadPoolExecutor] = None
+_batch_executor_lock = threading.Lock()
+
+
+def get_batch_executor() -> ThreadPoolExecutor:
+    """The pool shared by all batch lookups, MCPIZZA_BATCH_WORKERS threads, created on first use"""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            workers = int(os.getenv("MCPIZZA_BATCH_WORKERS", DEFAULT_BATCH_WORKERS))
+            _batch_executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="mcpizza-locate")
+        return _batch_executor
+
+
+def resolve_addresses(
+    addresses: List[str],
+    resolve: Callable[[str], Any],
+    timeout: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """Resolve many addresses concurrently on the shared batch pool
+
+    Addresses that normalize to the same key are resolved once. Results come
+    back in input order as {"address", "store"} or {"address", "error"}.
+    Lookups still queued when timeout (by default just under
+    MCPIZZA_BATCH_TIMEOUT) runs out are cancelled and reported as timed out;
+    ones already running finish in the background.
+    """
+    if not isinstance(addresses, list) or not all(isinstance(address, str) for address in addresses):
+        raise ValueError("addresses must be a list of strings")
+    if len(addresses) > MAX_BATCH_ADDRESSES:
+        raise ValueError(f"At most {MAX_BATCH_ADDRESSES} addresses can be resolved at once, got {len(addresses)}")
+    if not addresses:
+        return []
+
+    keys = [normalize_address(address) for address in addresses]
+    unique: Dict[str, str] = {}
+    for key, address in zip(keys, addresses):
+        unique.setdefault(key, address)
+
+    if timeout is None:
+        timeout = max(0.0, BATCH_TIMEOUT - BATCH_DEADLINE_MARGIN_SECONDS)
+    pool = get_batch_executor()
+    # Each worker runs in a copy of the caller's context (such as its order
+    # session); resolve should still not change it
+    futures = {
+        key: pool.submit(contextvars.copy_context().run, resolve, address)
+        for key, address in unique.items()
+    }
+    done, pending = wait(futures.values(), timeout=timeout)
+    for future in pending:
+        future.cancel()
+    if pending:
+        logger.warning(f"Batch store lookup: {len(pending)} of {len(futures)} addresses timed out after {timeout:g}s")
+    outcomes: Dict[str, Dict[str, Any]] = {}
+    for key, future in futures.items():
+        if future not in done:
+            outcomes[key] = {"error": f"Store lookup timed out after {timeout:g}s"}
+            continue
+        try:
+            store = future.result()
+            outcomes[key] = {"store": store} if store else {"error": "No Domino's stores found near that address."}
+        except Exception as e:
+            outcomes[key] = {"error": str(e)}
+    return [{"address": address, **outcomes[key]} for key, address in zip(keys, addresses)]
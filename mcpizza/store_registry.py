@@ -0,0 +1,409 @@
+"""
+MCPizza store registry
+
+An in-process registry of Domino's stores (StoreID, coordinates, service
+flags) with a KD-tree for nearest-N queries, so find_dominos_store can answer
+from a local snapshot instead of calling the store locator. The live locator
+is only used for addresses the registry can't place or has no store near,
+and the stores it returns are added to the registry.
+
+Registry files are JSON:
+
+    {"stores": [<Domino's store data with StoreCoordinates>, ...],
+     "zip_codes": {"95608": [38.6263, -121.3272], ...}}
+
+Addresses are placed by a literal "lat,lon" or by their ZIP code centroid.
+Build one from live locator results with:
+
+    python -m mcpizza.store_registry stores.json 95608 "1600 Pennsylvania Ave NW, Washington DC 20500"
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .store_cache import WAIT_TIME_FIELD
+
+logger = logging.getLogger("mcpizza")
+
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_MAX_DISTANCE_KM = 10.0
+DEFAULT_MOCK_STORE_COUNT = 240
+MIN_REBUILD_PENDING = 32
+
+Point = Tuple[float, float, float]
+
+_COORDINATES_RE = re.compile(r"^\s*(-?\d{1,2}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)\s*$")
+_ZIP_RE = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
+
+
+def to_point(lat: float, lon: float) -> Point:
+    """Unit vector for a latitude/longitude; chord length between points orders like great-circle distance"""
+    lat_r, lon_r = math.radians(lat), math.radians(lon)
+    return (math.cos(lat_r) * math.cos(lon_r), math.cos(lat_r) * math.sin(lon_r), math.sin(lat_r))
+
+
+def chord_to_km(squared_chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(squared_chord) / 2))
+
+
+def _squared_distance(a: Point, b: Point) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def store_coordinates(data: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(lat, lon) from a store's StoreCoordinates, or None if it has none"""
+    coordinates = data.get("StoreCoordinates")
+    if not isinstance(coordinates, dict):
+        return None
+    try:
+        return float(coordinates["StoreLatitude"]), float(coordinates["StoreLongitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class StoreRecord:
+    """One registered store: its Domino's store data and position"""
+
+    __slots__ = ("store_id", "lat", "lon", "point", "data")
+
+    def __init__(self, data: Dict[str, Any], lat: float, lon: float):
+        self.store_id = str(data.get("StoreID"))
+        self.lat = lat
+        self.lon = lon
+        self.point = to_point(lat, lon)
+        self.data = data
+
+    @classmethod
+    def from_store_data(cls, data: Dict[str, Any]) -> Optional["StoreRecord"]:
+        coordinates = store_coordinates(data)
+        if coordinates is None or data.get("StoreID") is None:
+            return None
+        return cls(data, *coordinates)
+
+    @property
+    def is_delivery_store(self) -> bool:
+        return bool(self.data.get("IsDeliveryStore", True))
+
+
+class KDTree:
+    """Static 3-d tree over (point, item) pairs"""
+
+    def __init__(self, entries: Iterable[Tuple[Point, Any]]):
+        entries = list(entries)
+        self._size = len(entries)
+        self._root = self._build(entries, 0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _build(self, entries: List[Tuple[Point, Any]], depth: int) -> Optional[tuple]:
+        if not entries:
+            return None
+        axis = depth % 3
+        entries.sort(key=lambda entry: entry[0][axis])
+        mid = len(entries) // 2
+        point, item = entries[mid]
+        return (point, item, axis, self._build(entries[:mid], depth + 1), self._build(entries[mid + 1:], depth + 1))
+
+    def nearest(self, point: Point, n: int = 1, accept: Optional[Callable[[Any], bool]] = None) -> List[Tuple[float, Any]]:
+        """Up to n (squared chord distance, item) pairs closest to point, nearest first"""
+        heap: List[Tuple[float, int, Any]] = []
+        counter = itertools.count()
+
+        def visit(node: Optional[tuple]) -> None:
+            if node is None:
+                return
+            node_point, item, axis, left, right = node
+            diff = point[axis] - node_point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if accept is None or accept(item):
+                distance = _squared_distance(point, node_point)
+                if len(heap) < n:
+                    heapq.heappush(heap, (-distance, next(counter), item))
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, next(counter), item))
+            if len(heap) < n or diff * diff < -heap[0][0]:
+                visit(far)
+
+        visit(self._root)
+        return [(-distance, item) for distance, _, item in sorted(heap, reverse=True)]
+
+
+class StoreRegistry:
+    """Stores indexed by position, plus ZIP code centroids for placing addresses"""
+
+    def __init__(self, stores: Iterable[Dict[str, Any]] = (), zip_codes: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.records: Dict[str, StoreRecord] = {}
+        self.zip_codes: Dict[str, Tuple[float, float]] = dict(zip_codes or {})
+        self._tree: Optional[KDTree] = None
+        self._pending: List[str] = []
+        self._lock = threading.RLock()
+        self.added = 0
+        for data in stores:
+            self.add(data)
+        self.added = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, store_id: Any) -> bool:
+        return str(store_id) in self.records
+
+    @classmethod
+    def from_file(cls, path: str) -> "StoreRegistry":
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        zip_codes = {code: (float(lat), float(lon)) for code, (lat, lon) in payload.get("zip_codes", {}).items()}
+        return cls(payload.get("stores", []), zip_codes)
+
+    def save(self, path: str) -> None:
+        """Write the registry (including stores learned from the live locator) atomically"""
+        with self._lock:
+            payload = {
+                "saved_at": time.time(),
+                "stores": [record.data for record in self.records.values()],
+                "zip_codes": {code: list(position) for code, position in self.zip_codes.items()},
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def add(self, data: Dict[str, Any]) -> Optional[StoreRecord]:
+        """Register or refresh a store; ignored when its data has no coordinates"""
+        record = StoreRecord.from_store_data(data)
+        if record is None:
+            return None
+        with self._lock:
+            previous = self.records.get(record.store_id)
+            self.records[record.store_id] = record
+            if previous is None:
+                self._pending.append(record.store_id)
+            elif previous.point != record.point:
+                # The tree still holds the old position
+                self._tree = None
+            self.added += 1
+        return record
+
+    def _current_tree(self) -> Tuple[KDTree, List[str]]:
+        with self._lock:
+            if self._tree is None or len(self._pending) > max(MIN_REBUILD_PENDING, int(math.sqrt(len(self.records)))):
+                self._tree = KDTree((record.point, store_id) for store_id, record in self.records.items())
+                self._pending = []
+            return self._tree, list(self._pending)
+
+    def nearest(self, lat: float, lon: float, n: int = 1, delivery_only: bool = False) -> List[Tuple[float, StoreRecord]]:
+        """Up to n (distance km, record) pairs closest to a position, nearest first"""
+        point = to_point(lat, lon)
+        records = self.records
+
+        def accept(store_id: str) -> bool:
+            return not delivery_only or records[store_id].is_delivery_store
+
+        tree, pending = self._current_tree()
+        candidates = tree.nearest(point, n, accept)
+        candidates.extend(
+            (_squared_distance(point, records[store_id].point), store_id)
+            for store_id in pending if accept(store_id)
+        )
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [(chord_to_km(distance), records[store_id]) for distance, store_id in candidates[:n]]
+
+    def locate(self, address: str) -> Optional[Tuple[float, float]]:
+        """Position of an address given as "lat,lon" or containing a known ZIP code"""
+        match = _COORDINATES_RE.match(address)
+        if match:
+            return float(match.group(1)), float(match.group(2))
+        for zip_code in reversed(_ZIP_RE.findall(address)):
+            if zip_code in self.zip_codes:
+                return self.zip_codes[zip_code]
+        return None
+
+    def nearest_to_address(self, address: str, n: int = 1, delivery_only: bool = True,
+                           max_km: Optional[float] = None) -> List[Tuple[float, StoreRecord]]:
+        """Nearest stores to an address, or [] when it can't be placed or nothing is within max_km"""
+        position = self.locate(address)
+        if position is None:
+            return []
+        results = self.nearest(position[0], position[1], n, delivery_only)
+        if max_km is not None:
+            results = [(distance, record) for distance, record in results if distance <= max_km]
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stores": len(self.records),
+                "zip_codes": len(self.zip_codes),
+                "pending": len(self._pending),
+                "learned": self.added,
+            }
+
+
+_registry: Optional[StoreRegistry] = None
+_registry_loaded = False
+
+
+def get_store_registry() -> Optional[StoreRegistry]:
+    """The registry named by MCPIZZA_STORE_REGISTRY, loaded on first use"""
+    global _registry, _registry_loaded
+    if not _registry_loaded:
+        _registry_loaded = True
+        path = os.getenv("MCPIZZA_STORE_REGISTRY")
+        if path:
+            try:
+                _registry = StoreRegistry.from_file(path)
+                logger.info(f"Loaded store registry {path} with {len(_registry)} stores")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot load store registry {path}: {e}")
+    return _registry
+
+
+def without_wait_times(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of store data without its wait times, which only a live profile call can tell"""
+    data = dict(data)
+    data.pop(WAIT_TIME_FIELD, None)
+    return data
+
+
+def registry_locator(locator: Callable[[str], Any], store_factory: Callable[[Dict[str, Any]], Any]) -> Callable[[str], Any]:
+    """Wrap a live locator so nearby registered stores are answered locally
+
+    store_factory turns registry store data into the locator's store type
+    (pizzapi's Store). Stores found by the live locator are registered.
+    Registry stores are answered without wait times, so the store cache
+    fetches live ones.
+    """
+    max_km = float(os.getenv("MCPIZZA_STORE_REGISTRY_MAX_KM", DEFAULT_MAX_DISTANCE_KM))
+
+    def locate(address: str) -> Any:
+        registry = get_store_registry()
+        if registry is None:
+            return locator(address)
+        nearest = registry.nearest_to_address(address, max_km=max_km)
+        if nearest:
+            return store_factory(without_wait_times(nearest[0][1].data))
+        store = locator(address)
+        if store:
+            # A copy: the store cache later updates the live store's wait times in place
+            registry.add(without_wait_times(store.data))
+        return store
+
+    return locate
+
+
+# Metro areas used to lay out mock stores: (city, state, ZIP, lat, lon)
+MOCK_METROS = [
+    ("New York", "NY", "10001", 40.7506, -73.9972),
+    ("Los Angeles", "CA", "90012", 34.0614, -118.2385),
+    ("Chicago", "IL", "60601", 41.8858, -87.6181),
+    ("Houston", "TX", "77002", 29.7569, -95.3625),
+    ("Phoenix", "AZ", "85004", 33.4515, -112.0686),
+    ("Philadelphia", "PA", "19103", 39.9523, -75.1724),
+    ("San Antonio", "TX", "78205", 29.4246, -98.4888),
+    ("San Diego", "CA", "92101", 32.7194, -117.1628),
+    ("Dallas", "TX", "75201", 32.7883, -96.7985),
+    ("Seattle", "WA", "98101", 47.6114, -122.3305),
+    ("Denver", "CO", "80202", 39.7527, -104.9992),
+    ("Atlanta", "GA", "30303", 33.7529, -84.3925),
+    ("Miami", "FL", "33130", 25.7667, -80.2043),
+    ("Boston", "MA", "02108", 42.3576, -71.0637),
+    ("Carmichael", "CA", "95608", 38.6263, -121.3272),
+    ("Ann Arbor", "MI", "48104", 42.2634, -83.7166),
+]
+
+_MOCK_STREETS = ["Main St", "Oak Ave", "Maple Dr", "Broadway", "Elm St", "Park Blvd", "Washington Ave", "Lake Rd", "2nd St", "Sunset Blvd"]
+_MOCK_WAITS = [("15-25", "10-15"), ("20-30", "10-20"), ("25-35", "15-25"), ("30-40", "15-25"), ("35-45", "20-30")]
+_MOCK_SPREAD_DEGREES = 0.08
+
+
+def mock_store_registry(count: int = DEFAULT_MOCK_STORE_COUNT, seed: int = 4521) -> StoreRegistry:
+    """Deterministic synthetic stores spread around real metro areas"""
+    rng = random.Random(seed)
+    stores = []
+    for i in range(count):
+        city, state, zip_code, lat, lon = MOCK_METROS[i % len(MOCK_METROS)]
+        delivery_minutes, pickup_minutes = rng.choice(_MOCK_WAITS)
+        store_lat = lat + rng.gauss(0, _MOCK_SPREAD_DEGREES)
+        store_lon = lon + rng.gauss(0, _MOCK_SPREAD_DEGREES)
+        stores.append({
+            "StoreID": str(4521 + i),
+            "Phone": f"(555) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}",
+            "StreetName": f"{rng.randint(100, 9999)} {rng.choice(_MOCK_STREETS)}",
+            "City": city,
+            "Region": state,
+            "PostalCode": zip_code,
+            "IsDeliveryStore": rng.random() < 0.9,
+            "MinDeliveryOrderAmount": rng.choice([10.00, 12.00, 15.00]),
+            "ServiceEstimatedWaitMinutes": {"Delivery": delivery_minutes, "Carryout": pickup_minutes},
+            "StoreCoordinates": {"StoreLatitude": f"{store_lat:.6f}", "StoreLongitude": f"{store_lon:.6f}"},
+        })
+    zip_codes = {zip_code: (lat, lon) for _, _, zip_code, lat, lon in MOCK_METROS}
+    return StoreRegistry(stores, zip_codes)
+
+
+_mock_registry: Optional[StoreRegistry] = None
+
+
+def get_mock_store_registry() -> StoreRegistry:
+    """The mock registry, MCPIZZA_MOCK_STORE_COUNT stores, built on first use"""
+    global _mock_registry
+    if _mock_registry is None:
+        _mock_registry = mock_store_registry(int(os.getenv("MCPIZZA_MOCK_STORE_COUNT", DEFAULT_MOCK_STORE_COUNT)))
+    return _mock_registry
+
+
+def nearest_mock_store(address: str = "") -> Dict[str, Any]:
+    """Store data of the mock store nearest an address
+
+    Addresses the mock registry can't place get a stable position near one
+    of the mock metros, so the same address always maps to the same store.
+    """
+    registry = get_mock_store_registry()
+    position = registry.locate(address)
+    if position is None:
+        digest = zlib.crc32(address.strip().lower().encode("utf-8"))
+        _, _, _, lat, lon = MOCK_METROS[digest % len(MOCK_METROS)]
+        position = (lat + ((digest >> 8) % 100 - 50) / 1000, lon + ((digest >> 16) % 100 - 50) / 1000)
+    return registry.nearest(position[0], position[1], delivery_only=True)[0][1].data
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Locate stores near the given addresses and write them to a registry file"""
+    import argparse
+
+    from pizzapi import StoreLocator
+
+    parser = argparse.ArgumentParser(description="Build an MCPizza store registry")
+    parser.add_argument("output", help="Registry file to write (extended if it exists)")
+    parser.add_argument("addresses", nargs="+", help="Addresses to locate stores around")
+    args = parser.parse_args(argv)
+
+    registry = StoreRegistry.from_file(args.output) if os.path.exists(args.output) else StoreRegistry()
+    for address in args.addresses:
+        try:
+            for store in StoreLocator.nearby_stores(address, "Delivery"):
+                if registry.add(without_wait_times(store.data)) is None:
+                    logger.warning(f"Store {store.data.get('StoreID')} has no coordinates")
+        except Exception as e:
+            logger.error(f"Skipping {address}: {e}")
+    registry.save(args.output)
+    print(f"Wrote {len(registry)} stores to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
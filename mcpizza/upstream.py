@@ -0,0 +1,69 @@
+"""
+MCPizza upstream calls
+
+pizzapi is synchronous, so every call that reaches Domino's (store locator,
+menu, order creation, pricing, placement) is run on a dedicated thread pool
+and awaited with a timeout. The event loop keeps serving other tool calls
+and protocol traffic while a slow upstream request is outstanding.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("mcpizza")
+
+DEFAULT_WORKERS = 16
+DEFAULT_TIMEOUT_SECONDS = 20.0
+DEFAULT_PLACE_ORDER_TIMEOUT_SECONDS = 60.0
+DEFAULT_BATCH_TIMEOUT_SECONDS = 120.0
+
+
+class UpstreamTimeout(Exception):
+    """Raised when an upstream call doesn't finish within its timeout
+
+    The worker thread can't be interrupted, so the call may still complete
+    in the background.
+    """
+
+
+UPSTREAM_TIMEOUT = float(os.getenv("MCPIZZA_UPSTREAM_TIMEOUT", DEFAULT_TIMEOUT_SECONDS))
+PLACE_ORDER_TIMEOUT = float(os.getenv("MCPIZZA_PLACE_ORDER_TIMEOUT", DEFAULT_PLACE_ORDER_TIMEOUT_SECONDS))
+BATCH_TIMEOUT = float(os.getenv("MCPIZZA_BATCH_TIMEOUT", DEFAULT_BATCH_TIMEOUT_SECONDS))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_upstream_executor() -> ThreadPoolExecutor:
+    """The shared upstream pool, MCPIZZA_UPSTREAM_WORKERS threads, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.getenv("MCPIZZA_UPSTREAM_WORKERS", DEFAULT_WORKERS))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcpizza-upstream")
+        return _executor
+
+
+async def run_blocking(fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None,
+                       name: Optional[str] = None) -> Any:
+    """Run a blocking call on the upstream pool and await it for at most timeout seconds
+
+    timeout defaults to MCPIZZA_UPSTREAM_TIMEOUT.
+    """
+    timeout = UPSTREAM_TIMEOUT if timeout is None else timeout
+    # Carry context variables (such as the current order session) into the worker
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    future = asyncio.get_running_loop().run_in_executor(get_upstream_executor(), call)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        name = name or getattr(fn, "__qualname__", "Upstream call")
+        logger.warning(f"{name} timed out after {timeout:g}s")
+        raise UpstreamTimeout(f"{name} timed out after {timeout:g}s")
+